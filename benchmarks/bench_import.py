@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Import time of pyngw, and check that heavy modules are not imported by `import pyngw`.
+
+Every measure is done in new interpreter. Reported time is median of import time minus
+median of interpreter startup time.
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --runs 20 --max-ms 50
+'''
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# these are imported on first use of methods which need them
+LAZY_MODULES = ('requests', 'urllib3', 'aiohttp', 'asyncio', 'osgeo', 'tusclient', 'pyngw.async_pyngw')
+
+CHECK = '''
+import sys
+import pyngw
+pyngw.Pyngw
+loaded = [name for name in {modules!r} if name in sys.modules]
+if loaded: sys.exit('imported by "import pyngw": ' + ', '.join(loaded))
+'''
+
+
+def run(code)->float:
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check=True, env=env)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time of pyngw')
+    parser.add_argument('--runs', type=int, default=10, help='number of interpreter starts for each measure (default: 10)')
+    parser.add_argument('--max-ms', type=float, help='exit with error if import of pyngw is slower')
+    args = parser.parse_args()
+
+    run(CHECK.format(modules=LAZY_MODULES))
+
+    # first run writes bytecode cache
+    run('import pyngw')
+    startup = statistics.median(run('pass') for _ in range(args.runs))
+    results = list()
+    for code in ('import pyngw', 'import pyngw; pyngw.Pyngw("http://localhost")', 'import pyngw; pyngw.AsyncPyngw'):
+        seconds = statistics.median(run(code) for _ in range(args.runs)) - startup
+        results.append(seconds)
+        print('{code:<50} {ms:8.1f} ms'.format(code=code, ms=seconds * 1000))
+
+    if args.max_ms is not None and results[0] * 1000 > args.max_ms:
+        sys.exit('import pyngw takes {ms:.1f} ms, limit is {limit} ms'.format(ms=results[0] * 1000, limit=args.max_ms))
+
+
+if __name__ == '__main__':
+    main()
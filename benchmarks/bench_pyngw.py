@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Benchmarks of pyngw against in-process NGW stand-in server.
+
+For every scenario report wall time, throughput in items per second, percentiles of query latency
+and number of http queries received by server.
+
+    python benchmarks/bench_pyngw.py
+    python benchmarks/bench_pyngw.py --latency 0.02 --scale 2 --only tree_walk feature_read
+    python benchmarks/bench_pyngw.py --json new.json --compare old.json
+'''
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pyngw
+from ngw_standin import StandinServer
+
+
+def percentile(values, fraction):
+    if len(values) == 0: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def make_tree(state, parent_id, depth, groups, layers):
+    """ groups subgroups and layers vector layers in every group, depth levels. Return number of resources """
+    count = 0
+    for index in range(layers):
+        state.add_resource('vector_layer', parent_id, 'layer {depth} {index}'.format(depth=depth, index=index))
+        count += 1
+    if depth == 0: return count
+    for index in range(groups):
+        group_id = state.add_resource('resource_group', parent_id, 'group {depth} {index}'.format(depth=depth, index=index))
+        count += 1 + make_tree(state, group_id, depth - 1, groups, layers)
+    return count
+
+
+def make_layers_with_styles(state, group_id, layers, features):
+    for index in range(layers):
+        layer_id = state.add_resource('vector_layer', group_id, 'layer {index}'.format(index=index))
+        state.add_resource('qgis_vector_style', layer_id, 'style {index}'.format(index=index))
+        state.add_features(layer_id, features)
+
+
+# scenarios: setup(server, scale, workdir) -> context, run(ngwapi, context) -> number of processed items
+
+def setup_tree_walk(server, scale, workdir):
+    group_id = server.state.add_resource('resource_group', 0, 'tree')
+    return dict(group_id=group_id, items=1 + make_tree(server.state, group_id, 3, 4, 2 * scale))
+
+
+def run_tree_walk(ngwapi, context):
+    ids = ngwapi.get_childs_ids_recursive(context['group_id'])
+    assert len(ids) == context['items']
+    return len(ids)
+
+
+def setup_feature_read(server, scale, workdir):
+    layer_id = server.state.add_resource('vector_layer', 0, 'read')
+    server.state.add_features(layer_id, 20000 * scale)
+    return dict(layer_id=layer_id)
+
+
+def run_feature_read(ngwapi, context):
+    return sum(1 for feature in ngwapi.iter_features(context['layer_id'], page_size=1000, prefetch=True))
+
+
+def run_feature_table(ngwapi, context):
+    return len(ngwapi.get_features_table(context['layer_id'], page_size=5000))
+
+
+def setup_feature_write(server, scale, workdir):
+    layer_id = server.state.add_resource('vector_layer', 0, 'write')
+    features = [{'geom': 'POINT ({x} {y})'.format(x=index, y=index), 'fields': {'name': 'feature ' + str(index)}}
+                for index in range(20000 * scale)]
+    return dict(layer_id=layer_id, features=features)
+
+
+def run_feature_write(ngwapi, context):
+    result = ngwapi.create_vector_features(context['layer_id'], context['features'], chunk_size=500, workers=4)
+    assert result.ok
+    return len(result.ids)
+
+
+def setup_feature_write_single(server, scale, workdir):
+    layer_id = server.state.add_resource('vector_layer', 0, 'write single')
+    return dict(layer_id=layer_id, count=200 * scale)
+
+
+def run_feature_write_single(ngwapi, context):
+    for index in range(context['count']):
+        ngwapi.create_vector_feature(context['layer_id'], 'POINT ({x} {y})'.format(x=index, y=index), {'name': str(index)})
+    return context['count']
+
+
+def setup_sync(server, scale, workdir):
+    layer_id = server.state.add_resource('vector_layer', 0, 'sync')
+    server.state.add_features(layer_id, 20000 * scale, fields=['code', 'name'])
+    features = [{'geom': feature['geom'], 'fields': dict(feature['fields'], code=feature['id'])}
+                for feature in server.state.features[layer_id].values()]
+    with server.state.lock:
+        for feature in server.state.features[layer_id].values(): feature['fields']['code'] = feature['id']
+    # 1% of features are changed, 1% are new
+    for feature in features[::100]: feature['fields']['name'] = 'changed'
+    features += [{'geom': 'POINT (30 60)', 'fields': {'code': -index, 'name': 'new'}} for index in range(1, len(features) // 100 + 1)]
+    return dict(layer_id=layer_id, features=features)
+
+
+def run_sync(ngwapi, context):
+    ngwapi.sync_vector_layer(context['layer_id'], context['features'], 'code')
+    return len(context['features'])
+
+
+def setup_upload(server, scale, workdir):
+    path = os.path.join(workdir, 'upload.bin')
+    with open(path, 'wb') as fp:
+        fp.write(os.urandom(32 * 1024 * 1024 * scale))
+    return dict(path=path, size=os.path.getsize(path))
+
+
+def run_upload(ngwapi, context):
+    upload_meta = ngwapi.upload_file(context['path'], chunk_size=4 * 1024 * 1024, resume=False)
+    assert upload_meta['size'] == context['size']
+    return context['size'] // (1024 * 1024)
+
+
+def setup_export(server, scale, workdir):
+    layer_ids = list()
+    for index in range(4):
+        layer_id = server.state.add_resource('vector_layer', 0, 'export ' + str(index))
+        server.state.add_features(layer_id, 10000 * scale)
+        layer_ids.append(layer_id)
+    return dict(layer_ids=layer_ids, workdir=workdir, scale=scale)
+
+
+def run_export(ngwapi, context):
+    for layer_id in context['layer_ids']:
+        path = os.path.join(context['workdir'], 'export_{layer_id}.geojson'.format(layer_id=layer_id))
+        ngwapi.download_vector_layer(path, layer_id, fid='ngw_id')
+        assert os.path.getsize(path) > 0
+    return len(context['layer_ids'])
+
+
+def run_export_stream(ngwapi, context):
+    count = 0
+    for layer_id in context['layer_ids']:
+        count += sum(1 for feature in ngwapi.iter_export_features(layer_id, zipped=True, fid='ngw_id'))
+    return count
+
+
+def run_export_tiled(ngwapi, context):
+    path = os.path.join(context['workdir'], 'tiled.geojson')
+    stats = ngwapi.export_vector_layer_tiled(path, context['layer_ids'][0], tile_features=2500 * context['scale'], workers=4)
+    return stats['features']
+
+
+def setup_mirror(server, scale, workdir):
+    group_id = server.state.add_resource('resource_group', 0, 'mirror')
+    make_layers_with_styles(server.state, group_id, 10 * scale, 1000)
+    return dict(group_id=group_id, path=os.path.join(workdir, 'mirror'), layers=10 * scale)
+
+
+def run_mirror(ngwapi, context):
+    errors = ngwapi.download_ngw4qgis(context['group_id'], context['path'], overwrite=True, workers=4, incremental=True)
+    assert len(errors) == 0
+    return context['layers']
+
+
+def setup_http_cache(server, scale, workdir):
+    # cache directory is filled before measured run, which revalidates all entries
+    context = setup_export(server, scale, workdir)
+    context['cache_dir'] = os.path.join(workdir, 'http_cache')
+    with pyngw.Pyngw(server.url, http_cache_dir=context['cache_dir']) as ngwapi:
+        run_export(ngwapi, context)
+    return context
+
+
+def run_http_cache(ngwapi, context):
+    from pyngw.http_cache import HttpCache
+    ngwapi.http_cache = HttpCache(context['cache_dir'])
+    count = run_export(ngwapi, context)
+    assert ngwapi.http_cache_stats()['hits'] == count
+    return count
+
+
+def setup_coalesce(server, scale, workdir):
+    group_id = server.state.add_resource('resource_group', 0, 'coalesce')
+    make_layers_with_styles(server.state, group_id, 25 * scale, 0)
+    return dict(group_id=group_id, threads=8)
+
+
+def run_coalesce(ngwapi, context):
+    # workers of one instance read same resources at same time
+    def work(index):
+        count = 0
+        for element in ngwapi.get_childs_resources(context['group_id']):
+            ngwapi.get_resource(element['resource']['id'])
+            count += 1 + len(ngwapi.get_childs_resources(element['resource']['id']))
+        return count
+
+    with ThreadPoolExecutor(context['threads']) as executor:
+        return sum(executor.map(work, range(context['threads'])))
+
+
+def setup_webmap(server, scale, workdir):
+    group_id = server.state.add_resource('resource_group', 0, 'webmap')
+    make_layers_with_styles(server.state, group_id, 50 * scale, 0)
+    return dict(group_id=group_id, layers=50 * scale)
+
+
+def run_webmap(ngwapi, context):
+    webmap_id = ngwapi.create_webmap_from_group(context['group_id'], display_name='benchmark')
+    assert len(ngwapi.get_resource(webmap_id)['webmap']['root_item']['children']) == context['layers']
+    return context['layers']
+
+
+def setup_tiles(server, scale, workdir):
+    style_id = server.state.add_resource('qgis_vector_style', 0, 'tiles')
+    return dict(style_id=style_id, workdir=workdir, bbox=(27.4, 53.8, 27.7, 54.0), max_zoom=13 + scale)
+
+
+def run_tiles(ngwapi, context):
+    path = os.path.join(context['workdir'], 'tiles.mbtiles')
+    if os.path.exists(path): os.remove(path)
+    stats = ngwapi.seed_tiles(context['style_id'], path, context['bbox'], 0, context['max_zoom'], workers=8)
+    assert stats['downloaded'] == stats['total']
+    return stats['downloaded']
+
+
+SCENARIOS = {
+    'tree_walk': (setup_tree_walk, run_tree_walk, 'resources'),
+    'feature_read': (setup_feature_read, run_feature_read, 'features'),
+    'feature_table': (setup_feature_read, run_feature_table, 'features'),
+    'feature_write': (setup_feature_write, run_feature_write, 'features'),
+    'feature_write_single': (setup_feature_write_single, run_feature_write_single, 'features'),
+    'sync': (setup_sync, run_sync, 'features'),
+    'upload': (setup_upload, run_upload, 'MiB'),
+    'export': (setup_export, run_export, 'layers'),
+    'export_stream': (setup_export, run_export_stream, 'features'),
+    'export_tiled': (setup_export, run_export_tiled, 'features'),
+    'mirror': (setup_mirror, run_mirror, 'layers'),
+    'http_cache': (setup_http_cache, run_http_cache, 'layers'),
+    'coalesce': (setup_coalesce, run_coalesce, 'resources'),
+    'webmap': (setup_webmap, run_webmap, 'layers'),
+    'tiles': (setup_tiles, run_tiles, 'tiles'),
+}
+
+try:
+    import numpy
+except ImportError:
+    # get_features_table requires numpy
+    del SCENARIOS['feature_table']
+
+
+def run_scenario(name, args, workdir):
+    setup, run, unit = SCENARIOS[name]
+    server = StandinServer(latency=args.latency, qml_size=args.qml_size, field_size=args.field_size, gzip_export=args.gzip).start()
+    try:
+        context = setup(server, args.scale, workdir)
+        latencies = list()
+        lock = threading.Lock()
+
+        def hook(measurements):
+            with lock:
+                latencies.append(measurements['latency'])
+
+        walls = list()
+        items = 0
+        queries = 0
+        for repeat in range(args.repeat):
+            with pyngw.Pyngw(server.url, pool_maxsize=args.pool_maxsize, metrics_hook=hook) as ngwapi:
+                server.reset_counter()
+                started = time.perf_counter()
+                items = run(ngwapi, context)
+                walls.append(time.perf_counter() - started)
+                queries = server.request_count()
+        wall = min(walls)
+        return dict(name=name, unit=unit, items=items, wall=wall, throughput=items / wall if wall else 0.0,
+                    queries=queries, counter={'{0} {1}'.format(*key): value for key, value in server.counter.items()},
+                    p50=percentile(latencies, 0.5), p95=percentile(latencies, 0.95), p99=percentile(latencies, 0.99))
+    finally:
+        server.stop()
+
+
+def print_results(results, baseline=None):
+    header = '{name:<22} {items:>8} {unit:<10} {wall:>9} {throughput:>12} {queries:>8} {p50:>8} {p95:>8} {p99:>8}'
+    print(header.format(name='scenario', items='items', unit='', wall='wall, s', throughput='items/s',
+                        queries='queries', p50='p50, ms', p95='p95, ms', p99='p99, ms')
+          + ('   vs baseline' if baseline else ''))
+    row = '{name:<22} {items:>8} {unit:<10} {wall:>9.3f} {throughput:>12.1f} {queries:>8} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f}'
+    for result in results:
+        line = row.format(name=result['name'], items=result['items'], unit=result['unit'], wall=result['wall'],
+                          throughput=result['throughput'], queries=result['queries'],
+                          p50=result['p50'] * 1000, p95=result['p95'] * 1000, p99=result['p99'] * 1000)
+        old = (baseline or {}).get(result['name'])
+        if old:
+            line += '   x{speedup:.2f} throughput, {queries:+d} queries'.format(
+                speedup=result['throughput'] / old['throughput'] if old['throughput'] else 0.0,
+                queries=result['queries'] - old['queries'])
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of pyngw against local NGW stand-in')
+    parser.add_argument('--only', nargs='+', choices=sorted(SCENARIOS), help='run only these scenarios')
+    parser.add_argument('--latency', type=float, default=0.002, help='seconds added by server to every query (default: 0.002)')
+    parser.add_argument('--scale', type=int, default=1, help='multiplier of data sizes (default: 1)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs of every scenario, best is reported (default: 1)')
+    parser.add_argument('--pool-maxsize', type=int, default=10, help='pool_maxsize of Pyngw (default: 10)')
+    parser.add_argument('--qml-size', type=int, default=2048, help='bytes in qml style (default: 2048)')
+    parser.add_argument('--field-size', type=int, default=16, help='chars in feature string fields (default: 16)')
+    parser.add_argument('--gzip', action='store_true', help='server sends export with gzip content-encoding')
+    parser.add_argument('--json', help='save results to json file')
+    parser.add_argument('--compare', help='json file of previous run, print change of throughput and queries')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = {result['name']: result for result in json.load(fp)['results']}
+
+    results = list()
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.only or list(SCENARIOS):
+            results.append(run_scenario(name, args, workdir))
+
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, 'w') as fp:
+            json.dump(dict(args=vars(args), results=results), fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Lightweight in-process stand-in for NextGIS Web REST API, for benchmarks of pyngw without live NGW.
+
+Implements endpoints used by pyngw:
+    /api/resource/                      GET ?parent=, POST
+    /api/resource/search/               GET
+    /api/resource/{id}                  GET, PUT, DELETE
+    /api/resource/{id}/feature/         GET (limit, offset), POST, PATCH, DELETE
+    /api/resource/{id}/feature_count    GET
+    /api/resource/{id}/export           GET (GeoJSON, zipped)
+    /api/resource/{id}/qml              GET
+    /api/resource/{id}/extent           GET
+    /api/component/file_upload/         tus.io OPTIONS, POST, HEAD, PATCH, GET and PUT /upload
+    /api/component/pyramid/pkg_version  GET
+
+Usage:
+    server = StandinServer(latency=0.005)
+    server.start()
+    ngwapi = pyngw.Pyngw(server.url)
+    ...
+    server.stop()
+'''
+
+import gzip
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+import uuid
+import zipfile
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+class StandinState:
+
+    '''
+    In-memory resource tree, features and uploads.
+    '''
+
+    def __init__(self, qml_size=2048, field_size=16):
+        self.qml_size = qml_size
+        self.field_size = field_size
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.resources = {0: self._resource(0, 'resource_group', None, 'Main resource group')}
+        self.features = dict()
+        self.next_fid = dict()
+        self.uploads = dict()
+
+    def _resource(self, resource_id, cls, parent_id, display_name):
+        return {'resource': {'id': resource_id, 'cls': cls,
+                             'parent': {'id': parent_id} if parent_id is not None else None,
+                             'display_name': display_name, 'keyname': None, 'description': None,
+                             'creation_date': '2020-01-01T00:00:00', 'owner_user': {'id': 4}}}
+
+    def add_resource(self, cls, parent_id, display_name, extra=None):
+        with self.lock:
+            resource_id = self.next_id
+            self.next_id += 1
+            resource = self._resource(resource_id, cls, parent_id, display_name)
+            if extra: resource.update(extra)
+            self.resources[resource_id] = resource
+            if cls in ('vector_layer', 'postgis_layer'):
+                resource.setdefault('feature_layer', {'fields': []})
+                resource.setdefault(cls, {'geometry_type': 'POINT', 'srs': {'id': 4326}})
+                self.features[resource_id] = dict()
+                self.next_fid[resource_id] = 1
+        return resource_id
+
+    def add_features(self, layer_id, count, fields=None):
+        """ add count point features to layer, with string fields padded to field_size """
+        fields = fields or ['name', 'description']
+        with self.lock:
+            definitions = self.resources[layer_id]['feature_layer']['fields']
+            definitions += [{'keyname': field, 'datatype': 'STRING', 'display_name': field}
+                            for field in fields if field not in [definition['keyname'] for definition in definitions]]
+            features = self.features[layer_id]
+            for _ in range(count):
+                fid = self.next_fid[layer_id]
+                self.next_fid[layer_id] += 1
+                features[fid] = {'id': fid,
+                                 'geom': 'POINT ({x} {y})'.format(x=27 + fid * 7919 % 8000 / 1000, y=53 + fid * 104729 % 9900 / 1000),
+                                 'fields': {field: (field + str(fid)).ljust(self.field_size, '.') for field in fields}}
+
+    def children(self, parent_id):
+        return [resource for resource in self.resources.values()
+                if resource['resource']['parent'] is not None and resource['resource']['parent']['id'] == parent_id]
+
+    def is_descendant(self, resource, ancestor_id):
+        while resource['resource']['parent'] is not None:
+            parent_id = resource['resource']['parent']['id']
+            if parent_id == ancestor_id: return True
+            resource = self.resources.get(parent_id)
+            if resource is None: return False
+        return False
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ngw-standin'
+    # headers and body are written separately, without this delayed ACK adds 40 ms to keep-alive queries
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self): self._dispatch('GET')
+    def do_POST(self): self._dispatch('POST')
+    def do_PUT(self): self._dispatch('PUT')
+    def do_PATCH(self): self._dispatch('PATCH')
+    def do_DELETE(self): self._dispatch('DELETE')
+    def do_HEAD(self): self._dispatch('HEAD')
+    def do_OPTIONS(self): self._dispatch('OPTIONS')
+
+    EMPTY_TILE = b'\x89PNG\r\n\x1a\n' + bytes(320)
+
+    ROUTES = [
+        (re.compile(r'^/api/resource/$'), 'resources'),
+        (re.compile(r'^/api/resource/search/$'), 'search'),
+        (re.compile(r'^/api/resource/(\d+)$'), 'resource'),
+        (re.compile(r'^/api/resource/(\d+)/feature/$'), 'features'),
+        (re.compile(r'^/api/resource/(\d+)/feature_count$'), 'feature_count'),
+        (re.compile(r'^/api/resource/(\d+)/export$'), 'export'),
+        (re.compile(r'^/api/resource/(\d+)/qml$'), 'qml'),
+        (re.compile(r'^/api/resource/(\d+)/extent$'), 'extent'),
+        (re.compile(r'^/api/component/file_upload/$'), 'tus'),
+        (re.compile(r'^/api/component/file_upload/upload$'), 'upload'),
+        (re.compile(r'^/api/component/file_upload/([0-9a-f]{32})$'), 'tus_upload'),
+        (re.compile(r'^/api/component/pyramid/pkg_version$'), 'pkg_version'),
+        (re.compile(r'^/api/component/render/tile$'), 'tile'),
+    ]
+
+    @property
+    def state(self)->StandinState:
+        return self.server.state
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        self.query = dict((key, values[0]) for key, values in parse_qs(url.query, keep_blank_values=True).items())
+        self.body = self._read_body()
+        if self.server.latency: time.sleep(self.server.latency)
+        for pattern, name in self.ROUTES:
+            match = pattern.match(url.path)
+            if match is None: continue
+            with self.server.counter_lock:
+                self.server.counter[(method, name)] += 1
+            handler = getattr(self, '_{name}_{method}'.format(name=name, method=method.lower()), None)
+            if handler is None: return self._send(405, {'message': 'method not allowed'})
+            try:
+                return handler(*match.groups())
+            except KeyError:
+                return self._send(404, {'message': 'not found'})
+        self._send(404, {'message': 'not found ' + url.path})
+
+    def _read_body(self)->bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = list()
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(chunks)
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _send(self, status, data=None, raw=None, content_type='application/json', headers=None):
+        body = raw if raw is not None else (json.dumps(data).encode('utf-8') if data is not None else b'')
+        if self.command == 'GET' and status == 200:
+            # strong validator of body, conditional query with same ETag gets 304 without body
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            headers = dict(headers or {}, ETag=etag)
+            if self.headers.get('If-None-Match') == etag:
+                status, body = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD': self.wfile.write(body)
+
+    # resources
+
+    def _resources_get(self):
+        return self._send(200, self.state.children(int(self.query['parent'])))
+
+    def _resources_post(self):
+        payload = json.loads(self.body)
+        resource = payload.pop('resource')
+        resource_id = self.state.add_resource(resource['cls'], resource['parent']['id'], resource.get('display_name'), payload)
+        return self._send(201, {'id': resource_id, 'parent': resource['parent']})
+
+    def _search_get(self):
+        query = dict(self.query)
+        resources = list(self.state.resources.values())
+        for key in ('cls', 'display_name', 'keyname'):
+            if key in query: resources = [resource for resource in resources if resource['resource'][key] == query[key]]
+        if 'display_name__ilike' in query:
+            pattern = re.compile('^' + re.escape(query['display_name__ilike']).replace('%', '.*').replace('_', '.') + '$', re.IGNORECASE)
+            resources = [resource for resource in resources if pattern.match(resource['resource']['display_name'] or '')]
+        if 'parent_id' in query:
+            resources = [resource for resource in resources if resource['resource']['parent'] is not None
+                         and resource['resource']['parent']['id'] == int(query['parent_id'])]
+        if 'parent_id__recursive' in query:
+            resources = [resource for resource in resources if self.state.is_descendant(resource, int(query['parent_id__recursive']))]
+        return self._send(200, resources)
+
+    def _resource_get(self, resource_id):
+        return self._send(200, self.state.resources[int(resource_id)])
+
+    def _resource_put(self, resource_id):
+        resource = self.state.resources[int(resource_id)]
+        for key, value in json.loads(self.body).items():
+            if key == 'resource':
+                resource['resource'].update(value)
+            else:
+                resource.setdefault(key, {}).update(value)
+        return self._send(200, {})
+
+    def _resource_delete(self, resource_id):
+        with self.state.lock:
+            del self.state.resources[int(resource_id)]
+        return self._send(200, None)
+
+    # features
+
+    def _point(self, feature):
+        x, y = feature['geom'][len('POINT ('):-1].split()
+        return float(x), float(y)
+
+    def _filtered_fids(self, features):
+        # intersects filter is checked against bounding box of polygon, features are points
+        fids = sorted(features)
+        if 'intersects' in self.query:
+            numbers = [float(value) for value in re.findall(r'-?[\d.]+(?:e-?\d+)?', self.query['intersects'])]
+            min_x, max_x, min_y, max_y = min(numbers[0::2]), max(numbers[0::2]), min(numbers[1::2]), max(numbers[1::2])
+            fids = [fid for fid in fids if min_x <= self._point(features[fid])[0] <= max_x and min_y <= self._point(features[fid])[1] <= max_y]
+        return fids
+
+    def _features_get(self, resource_id):
+        features = self.state.features[int(resource_id)]
+        offset = int(self.query.get('offset', 0))
+        limit = int(self.query['limit']) if 'limit' in self.query else None
+        fids = self._filtered_fids(features)[offset:offset + limit if limit is not None else None]
+        result = list()
+        for fid in fids:
+            feature = dict(features[fid])
+            if self.query.get('geom') == 'no': del feature['geom']
+            if 'fields' in self.query:
+                names = [name for name in self.query['fields'].split(',') if name]
+                feature['fields'] = {name: value for name, value in feature['fields'].items() if name in names}
+            result.append(feature)
+        return self._send(200, result)
+
+    def _features_post(self, resource_id):
+        feature = json.loads(self.body)
+        with self.state.lock:
+            fid = self.state.next_fid[int(resource_id)]
+            self.state.next_fid[int(resource_id)] += 1
+            self.state.features[int(resource_id)][fid] = dict(feature, id=fid)
+        return self._send(200, {'id': fid})
+
+    def _features_patch(self, resource_id):
+        features = self.state.features[int(resource_id)]
+        result = list()
+        with self.state.lock:
+            for feature in json.loads(self.body):
+                if 'id' in feature:
+                    features[feature['id']].update(feature)
+                else:
+                    feature['id'] = self.state.next_fid[int(resource_id)]
+                    self.state.next_fid[int(resource_id)] += 1
+                    features[feature['id']] = feature
+                result.append({'id': feature['id']})
+        return self._send(200, result)
+
+    def _features_delete(self, resource_id):
+        features = self.state.features[int(resource_id)]
+        with self.state.lock:
+            if self.body:
+                for feature in json.loads(self.body): features.pop(feature['id'], None)
+            else:
+                features.clear()
+        return self._send(200, None)
+
+    def _feature_count_get(self, resource_id):
+        return self._send(200, {'total_count': len(self.state.features[int(resource_id)])})
+
+    def _export_get(self, resource_id):
+        features = self.state.features[int(resource_id)]
+        fid_field = self.query.get('fid')
+        collection = {'type': 'FeatureCollection', 'name': str(resource_id), 'features': list()}
+        for fid in self._filtered_fids(features):
+            x, y = self._point(features[fid])
+            properties = dict(features[fid]['fields'])
+            if fid_field: properties[fid_field] = fid
+            collection['features'].append({'type': 'Feature', 'properties': properties,
+                                           'geometry': {'type': 'Point', 'coordinates': [float(x), float(y)]}})
+        body = json.dumps(collection).encode('utf-8')
+        if self.query.get('zipped') == 'true':
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                # fixed date, same layer gives same archive and ETag
+                archive.writestr(zipfile.ZipInfo(str(resource_id) + '.geojson', date_time=(2020, 1, 1, 0, 0, 0)), body, zipfile.ZIP_DEFLATED)
+            body, content_type = buffer.getvalue(), 'application/zip'
+        else:
+            content_type = 'application/geo+json'
+        if self.server.gzip_export and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            return self._send(200, raw=gzip.compress(body, compresslevel=1, mtime=0), content_type=content_type, headers={'Content-Encoding': 'gzip'})
+        return self._send(200, raw=body, content_type=content_type)
+
+    def _qml_get(self, resource_id):
+        self.state.resources[int(resource_id)]
+        return self._send(200, raw=b'<qgis>' + b' ' * self.state.qml_size + b'</qgis>', content_type='application/xml')
+
+    def _extent_get(self, resource_id):
+        self.state.resources[int(resource_id)]
+        points = [self._point(feature) for feature in self.state.features.get(int(resource_id), {}).values()]
+        if not points:
+            return self._send(200, {'extent': {'minLon': None, 'maxLon': None, 'minLat': None, 'maxLat': None}})
+        return self._send(200, {'extent': {'minLon': min(x for x, y in points), 'maxLon': max(x for x, y in points),
+                                           'minLat': min(y for x, y in points), 'maxLat': max(y for x, y in points)}})
+
+    # file upload
+
+    def _upload_put(self):
+        upload_id = uuid.uuid4().hex
+        self.state.uploads[upload_id] = {'length': len(self.body), 'data': self.body}
+        return self._send(200, self._upload_meta(upload_id))
+
+    def _upload_meta(self, upload_id):
+        return {'id': upload_id, 'size': len(self.state.uploads[upload_id]['data']), 'mime_type': 'application/octet-stream', 'name': 'file'}
+
+    def _tus_options(self):
+        headers = {'Tus-Resumable': '1.0.0', 'Tus-Version': '1.0.0', 'Tus-Extension': 'creation,termination'}
+        if self.server.tus_concatenation: headers['Tus-Extension'] += ',concatenation'
+        return self._send(204, headers=headers)
+
+    def _tus_post(self):
+        upload_id = uuid.uuid4().hex
+        concat = self.headers.get('Upload-Concat', '')
+        if concat.startswith('final;'):
+            data = b''.join(self.state.uploads[url.rstrip('/').split('/')[-1]]['data'] for url in concat[len('final;'):].split())
+            self.state.uploads[upload_id] = {'length': len(data), 'data': data}
+        else:
+            self.state.uploads[upload_id] = {'length': int(self.headers['Upload-Length']), 'data': b''}
+        return self._send(201, headers={'Location': '/api/component/file_upload/' + upload_id, 'Tus-Resumable': '1.0.0'})
+
+    def _tus_upload_head(self, upload_id):
+        upload = self.state.uploads[upload_id]
+        return self._send(200, headers={'Upload-Offset': str(len(upload['data'])), 'Upload-Length': str(upload['length'])})
+
+    def _tus_upload_patch(self, upload_id):
+        upload = self.state.uploads[upload_id]
+        if int(self.headers['Upload-Offset']) != len(upload['data']): return self._send(409, {'message': 'offset mismatch'})
+        upload['data'] += self.body
+        return self._send(204, headers={'Upload-Offset': str(len(upload['data'])), 'Tus-Resumable': '1.0.0'})
+
+    def _tus_upload_get(self, upload_id):
+        return self._send(200, self._upload_meta(upload_id))
+
+    def _pkg_version_get(self):
+        return self._send(200, {'nextgisweb': '4.0.0'})
+
+    def _tile_get(self):
+        # every third tile has data, others are same empty image, like render of sparse layer
+        for resource_id in self.query['resource'].split(','):
+            self.state.resources[int(resource_id)]
+        x, y, z = int(self.query['x']), int(self.query['y']), int(self.query['z'])
+        if (x + y) % 3:
+            return self._send(200, raw=self.EMPTY_TILE, content_type='image/png')
+        return self._send(200, raw=self.EMPTY_TILE + '{z}/{x}/{y}'.format(z=z, x=x, y=y).encode('ascii') * 64, content_type='image/png')
+
+
+class StandinServer(ThreadingHTTPServer):
+
+    '''
+    Threaded http server with StandinState. latency is seconds added to every query,
+    gzip_export enables gzip content-encoding of export responses.
+    '''
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, qml_size=2048, field_size=16, tus_concatenation=False, gzip_export=False):
+        super().__init__((host, port), StandinHandler)
+        self.state = StandinState(qml_size=qml_size, field_size=field_size)
+        self.latency = latency
+        self.tus_concatenation = tus_concatenation
+        self.gzip_export = gzip_export
+        self.counter = Counter()
+        self.counter_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self)->str:
+        return 'http://{host}:{port}'.format(host=self.server_address[0], port=self.server_address[1])
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def request_count(self)->int:
+        with self.counter_lock:
+            return sum(self.counter.values())
+
+    def reset_counter(self):
+        with self.counter_lock:
+            self.counter.clear()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Run NGW stand-in server')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every query')
+    args = parser.parse_args()
+    server = StandinServer(port=args.port, latency=args.latency)
+    print('NGW stand-in on ' + server.url)
+    server.serve_forever()
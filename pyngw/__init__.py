@@ -1 +1,14 @@
 from .pyngw import *
+
+
+def __getattr__(name):
+    # AsyncPyngw imports asyncio and aiohttp, load it only when it is used.
+    # aiohttp is optional (pip install pyngw[async]), without it ImportError with install hint is raised
+    if name == 'AsyncPyngw':
+        from .async_pyngw import AsyncPyngw
+        return AsyncPyngw
+    raise AttributeError("module {module!r} has no attribute {name!r}".format(module=__name__, name=name))
+
+
+def __dir__():
+    return sorted(list(globals()) + ['AsyncPyngw'])
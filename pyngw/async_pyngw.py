@@ -0,0 +1,477 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import datetime
+import fnmatch
+import logging
+import os
+
+try:
+    import aiohttp
+except ImportError as e:
+    # optional dependency, Pyngw works without it
+    raise ImportError('AsyncPyngw requires aiohttp, install it with: pip install pyngw[async]', name='aiohttp') from e
+
+from .codec import ResourceRecord
+from .pyngw import Pyngw
+from .retry import RetryPolicy
+
+
+class AsyncPyngw:
+
+    '''
+    asyncio version of Pyngw. Methods have same names and arguments as in Pyngw, but are coroutines.
+
+    All queries are sent through one aiohttp connection pool.
+    Number of queries in flight is limited by concurrency argument, so thousands of coroutines
+    can be gathered at once without opening thousands of connections.
+    '''
+
+    def __init__(self,ngw_url='https://sandbox.nextgis.com',login=None,password=None,
+            concurrency=100,
+            timeout=(10, 600),
+            max_retries=5):
+        """[create async api instance with stored login and passwords]
+
+        Keyword Arguments:
+            ngw_url {str} -- [url of ngw instanse. Must not ended with slash symbol] (default: {'https://sandbox.nextgis.com'})
+            login {str} -- [login] (default: {None})
+            password {str} -- [password] (default: {None})
+            concurrency {int} -- [max number of queries in flight, and size of connection pool] (default: {100})
+            timeout {tuple} -- [default (connect, read) timeout in seconds for every query] (default: {(10, 600)})
+            max_retries {int} -- [repeats of query on 429, 502, 503, 504 and timeouts, see RetryPolicy] (default: {5})
+        """
+        self.ngw_url=ngw_url
+        self.login=login
+        self.password=password
+        if self.login is None and self.password is None:
+            self.ngw_creds = None
+        else:
+            self.ngw_creds = aiohttp.BasicAuth(self.login, self.password)
+        if self.ngw_url.endswith('/'): self.ngw_url = self.ngw_url.rstrip('/')
+        if '.nextgis.com' in self.ngw_url.lower():
+            if not self.ngw_url.lower().startswith('https://'): raise ValueError('while connect to nextgis.com url should use HTTPS ')
+
+        self.logger = logging.getLogger(__name__)
+
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._session = None
+        self._semaphore = None
+        self._recursive_search = None
+        self.retry_policy = RetryPolicy(max_retries=max_retries)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """ close connection pool """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self):
+        # session and semaphore must be created inside running event loop
+        if self._session is None or self._session.closed:
+            connect_timeout, read_timeout = self.timeout if isinstance(self.timeout, tuple) else (self.timeout, self.timeout)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                auth=self.ngw_creds,
+                timeout=aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout))
+        return self._session
+
+    async def _request(self, method, url, **kwargs):
+        """ send query through shared connection pool, return decoded json of response """
+        async def read(response):
+            return await response.json(content_type=None)
+        return await self._send(method, url, read, **kwargs)
+
+    async def _download(self, method, url, path, **kwargs):
+        """ send query through shared connection pool, save body of response to path """
+        async def read(response):
+            with open(path, 'wb') as out_file:
+                async for chunk in response.content.iter_chunked(1024*64):
+                    out_file.write(chunk)
+        return await self._send(method, url, read, **kwargs)
+
+    async def _send(self, method, url, read, **kwargs):
+        # repeat query by retry_policy. File object body is rewinded before repeat
+        session = self.session
+        body = kwargs.get('data')
+        rewind = body.tell() if hasattr(body, 'seek') and hasattr(body, 'tell') else None
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    async with session.request(method, url, **kwargs) as response:
+                        if response.status not in RetryPolicy.RETRY_STATUSES or not self.retry_policy.should_retry(method, attempt, response.status):
+                            response.raise_for_status()
+                            return await read(response)
+                        delay = self.retry_policy.delay(attempt, response.headers.get('Retry-After'))
+                        reason = str(response.status)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if (body is not None and rewind is None) or not self.retry_policy.should_retry(method, attempt): raise
+                delay = self.retry_policy.delay(attempt)
+                reason = str(e) or type(e).__name__
+            self.logger.warning('{method} {url} failed: {reason}, retry in {delay:.1f} s'.format(method=method, url=url, reason=reason, delay=delay))
+            await asyncio.sleep(delay)
+            if rewind is not None: body.seek(rewind)
+            attempt += 1
+
+    async def _upload_file(self, filepath):
+        """ upload file to file_upload component, return file_upload json for use in resource payload """
+        with open(filepath, 'rb') as fd:
+            return await self._request('PUT', self.ngw_url + '/api/component/file_upload/upload', data=fd)
+
+    async def _create_resource(self, payload):
+        response = await self._request('POST', self.ngw_url+'/api/resource/', json=payload)
+        if response.get('exception'):
+            raise ValueError(response.get('exception') +': '+ response.get('message', ''))
+        return response['id']
+
+    def generate_name(self):
+        return str(datetime.datetime.now())
+
+    def get_resource_url(self,resource_id)->str:
+        """  return url of resource, like https://sandbox.nextgis.com/resourse/1234 """
+        return '{url}/resource/{resource_id}'.format(url=self.ngw_url, resource_id=resource_id)
+
+    def get_TMS_url(self,style_id):
+        url = '{url}/api/component/render/tile?resource={style_id}'
+        url = url.format(url=self.ngw_url,style_id=style_id)
+        url = url + '&x={x}&y={y}&z={z}'
+        return url
+
+    async def check_resource_id(self,resource_id)->bool:
+        '''
+        return True if api return ok for given resource id
+        '''
+        if str(resource_id)=='': return False
+        try:
+            await self.get_resource(resource_id)
+        except aiohttp.ClientError:
+            return False
+        return True
+
+    async def get_resource(self,resource_id):
+        """  wraper for simple GET """
+        url = '{url}/api/resource/{resource_id}'.format(url=self.ngw_url, resource_id=resource_id)
+        return await self._request('GET', url)
+
+    async def get_resource_name(self,resource_id)->str:
+        """  return name of resource """
+        resource = await self.get_resource(resource_id)
+        return resource['resource']['display_name']
+
+    async def get_childs_resources(self,resource_group_id):
+        """[wraper for GET query ?parent= ]"""
+        url = '{url}/api/resource/?parent={resource_group_id}'.format(url=self.ngw_url, resource_group_id=resource_group_id)
+        return await self._request('GET', url)
+
+    async def get_childs_ids_recursive(self,resource_id)->list:
+        # get flat list of ids of element resource tree, children of same parent are queried concurrently
+        ids = list()
+        childs = await self.get_childs_resources(resource_id)
+        subtrees = await asyncio.gather(*[self.get_childs_ids_recursive(child['resource']['id']) for child in childs])
+        for subtree in subtrees:
+            ids.extend(subtree)
+        ids.append(resource_id)
+        return ids
+
+    async def get_feature_count(self,resource_id):
+        url=self.ngw_url+'/api/resource/'+str(resource_id)+'/feature_count'
+        response = await self._request('GET', url)
+        feature_count = response.get('total_count',None)
+        if feature_count is not None:
+            return int(feature_count)
+        else:
+            return None
+
+    async def get_features(self,resource_id:int,params:str='')->list:
+        """  get all features from vector layer as is. params: GET params, same as in Pyngw.get_features """
+        url = '{url}/api/resource/{resource_id}/feature/'.format(url=self.ngw_url, resource_id=resource_id)
+        if params != '':
+            url=url+'?'+params
+        return await self._request('GET', url)
+
+    async def iter_features(self,resource_id:int,page_size:int=1000,params:str='',prefetch:bool=False):
+        """  async generator of features from vector layer, read by pages. Arguments same as in Pyngw.iter_features """
+        assert page_size > 0
+
+        async def get_page(offset):
+            page_params = 'limit={limit}&offset={offset}'.format(limit=page_size, offset=offset)
+            if params != '': page_params = params + '&' + page_params
+            return await self.get_features(resource_id, page_params)
+
+        offset = 0
+        page = await get_page(offset)
+        while True:
+            if len(page) < page_size:
+                for feature in page: yield feature
+                return
+            offset += page_size
+            if prefetch: next_page = asyncio.ensure_future(get_page(offset))
+            try:
+                for feature in page: yield feature
+            except GeneratorExit:
+                if prefetch: next_page.cancel()
+                raise
+            page = await next_page if prefetch else await get_page(offset)
+
+    async def search_resource(self,display_name=None,cls=None,keyname=None,parent_id=None,owner_user_id=None,recursive=False,**params)->list:
+        """
+        Wrapper for ngw api search method /api/resource/search/. Arguments same as in Pyngw.search_resource
+        """
+        query = dict(params)
+        if display_name is not None: query['display_name'] = display_name
+        if cls is not None: query['cls'] = cls
+        if keyname is not None: query['keyname'] = keyname
+        if owner_user_id is not None: query['owner_user__id'] = owner_user_id
+        if parent_id is not None:
+            query['parent_id__recursive' if recursive else 'parent_id'] = parent_id
+        response = await self._request('GET', self.ngw_url+'/api/resource/search/', params=query)
+
+        # old ngw versions ignore filters they do not know, so check result again
+        results = list()
+        for element in response:
+            if display_name is not None and element['resource']['display_name'] != display_name: continue
+            if cls is not None and element['resource']['cls'] != cls: continue
+            if keyname is not None and element['resource'].get('keyname') != keyname: continue
+            if parent_id is not None and not recursive:
+                if element['resource']['parent'] is None or int(element['resource']['parent']['id']) != int(parent_id): continue
+            results.append(element)
+        if parent_id is not None and recursive and not await self._recursive_search_supported():
+            # server ignores recursive filter: parent chain of every result should lead to parent_id. Ancestors not found by search are queried
+            parents = Pyngw._parents_of(results)
+            while True:
+                results, unknown = Pyngw._split_by_ancestor(results, int(parent_id), parents)
+                if len(unknown) == 0: break
+                parents.update(zip(unknown, await asyncio.gather(*[self._parent_id_or_none(resource_id) for resource_id in unknown])))
+        return results
+
+    async def _recursive_search_supported(self)->bool:
+        """ True if server applies parent_id__recursive filter of search, see Pyngw._recursive_search_supported """
+        if self._recursive_search is None:
+            try:
+                found = await self._request('GET', self.ngw_url+'/api/resource/search/', params={'parent_id': 0, 'parent_id__recursive': -1})
+                self._recursive_search = len(found) == 0
+            except aiohttp.ClientResponseError as e:
+                if e.status >= 500: raise
+                self._recursive_search = True
+        return self._recursive_search
+
+    async def _parent_id_or_none(self,resource_id):
+        # unreadable ancestor is treated as outside of subtree
+        try:
+            parent = (await self.get_resource(resource_id))['resource']['parent']
+        except aiohttp.ClientResponseError as e:
+            self.logger.warning('ancestor {resource_id} of search result is not readable: {e}'.format(resource_id=resource_id, e=e))
+            return None
+        return int(parent['id']) if parent else None
+
+    async def search_resource_by_name(self,name,group_id=0,cls='',recursive=False)->list:
+        """
+        Search by name with wildcards * ? using api method /search. Returns list of dicts.
+        """
+        params = dict()
+        if '*' in name or '?' in name or '[' in name:
+            if '[' not in name:
+                params['display_name__ilike'] = name.replace('%', '\\%').replace('_', '\\_').replace('*', '%').replace('?', '_')
+        else:
+            params['display_name'] = name
+        response = await self.search_resource(cls=cls if cls != '' else None,parent_id=group_id,recursive=recursive,**params)
+        results=list()
+        for element in response:
+            if name == element['resource']['display_name'] or fnmatch.fnmatch(element['resource']['display_name'], name):
+                results.append(element)
+        return results
+
+    async def get_resource_id_by_name(self,name,group_id=0)->int:
+        """
+        search resources in group_id, returns id of frist fround resource with name.
+        """
+        response = await self.search_resource(display_name=name,parent_id=group_id)
+        for element in response:
+            if element['resource']['display_name']==name:
+                return element['resource']['id']
+        return None
+
+    async def search_by_cls(self,group_id=0,cls='webmap',recursive=False):
+        response = await self.search_resource(cls=cls,parent_id=group_id,recursive=recursive)
+        found_ids = [element['resource']['id'] for element in response]
+        if len(found_ids) == 0:
+            return None
+        else:
+            return found_ids
+
+    async def update_resource_payload(self,resource_id:int,payload,skip_errors=True):
+        """ wrapper for PUT query, send payload"""
+        assert payload is not None
+        try:
+            await self._request('PUT', self.ngw_url+'/api/resource/'+str(resource_id), json=payload)
+        except aiohttp.ClientResponseError:
+            if skip_errors == False: raise
+
+    async def delete_resource_by_id(self,id:int):
+        """delete ngw resource"""
+        await self._request('DELETE', self.ngw_url+'/api/resource/'+str(id))
+
+    async def delete_features(self,resource_id:int,ids:list):
+        """
+        delete features from vector layer by list of features
+        """
+        if len(ids)<1: return False
+        url=self.ngw_url+'/api/resource/'+str(resource_id)+'/feature/'
+        payload = [{"id":int(id)} for id in ids]
+        await self._request('DELETE', url, json=payload)
+
+    async def truncate_group(self,group_id):
+        resources = await self.get_childs_resources(group_id)
+        await asyncio.gather(*[self.delete_resource_by_id(resource['resource']['id']) for resource in resources])
+
+    async def truncate_layer(self,layer_id):
+        """[Delete all features in layer]"""
+        await self._request('DELETE', self.ngw_url+'/api/resource/'+str(layer_id)+'/feature/')
+
+    async def create_resource_group(self, parent_id=0, display_name='', overwrite=None):
+        """[Create new resource group.] Arguments same as in Pyngw.create_resource_group"""
+        if display_name == '': display_name = self.generate_name()
+        serch_result = None
+        for element in await self.search_resource(display_name=display_name,cls='resource_group',parent_id=parent_id):
+            serch_result = element['resource']['id']
+            break
+        if serch_result is None:
+            payload = dict(resource=dict(cls='resource_group', parent=dict(id=parent_id), display_name=display_name))
+            return int(await self._create_resource(payload))
+        if overwrite == 'truncate':
+            await self.truncate_group(serch_result)
+            return serch_result
+        raise ValueError('Already exists group '+display_name)
+
+    async def create_vector_feature(self,layer_id,geom,fields)->int:
+        payload = {"geom": geom, "fields": fields}
+        response = await self._request('POST', self.ngw_url+'/api/resource/'+str(layer_id)+'/feature/', json=payload)
+        return response['id']
+
+    async def create_vector_layer(self,group_id,display_name,geometry_type,fields):
+        if display_name == '': display_name = 'layer ' + self.generate_name()
+        assert 'LINESTRING' in geometry_type or 'POINT' in geometry_type or 'POLYGON' in geometry_type
+        assert isinstance(fields, list)
+        payload = {
+            "resource": {"cls": "vector_layer", "parent": {"id": group_id}, "display_name": display_name},
+            "vector_layer": {"geometry_type": geometry_type, "srs": {"id": 3857}, "fields": fields}
+        }
+        return await self._create_resource(payload)
+
+    async def upload_vector_layer(self,filepath,group_id, display_name='',
+            cast_is_multi=True,
+            cast_has_z=False,
+            skip_other_geometry_types=False,
+            fix_errors='LOSSY',
+            skip_errors=True,
+            fid_source='AUTO',
+            fid_field=None):
+        """[Create vector layer from file] Arguments same as in Pyngw.upload_vector_layer"""
+        if display_name == '': display_name = self.generate_name()
+        source = await self._upload_file(filepath)
+        payload=dict(
+            resource=dict(cls='vector_layer', parent=dict(id=group_id), display_name=display_name),
+            vector_layer=dict(source=source,
+                srs=dict(id=3857),
+                cast_is_multi=cast_is_multi,
+                cast_has_z=cast_has_z,
+                skip_other_geometry_types=skip_other_geometry_types,
+                fix_errors=fix_errors,
+                skip_errors=skip_errors,
+                fid_source=fid_source)
+        )
+        if fid_field is not None: payload['vector_layer']['fid_field']=fid_field
+        return await self._create_resource(payload)
+
+    async def upload_raster_layer(self, filepath, group_id, display_name = ''):
+        """[Create raster layer from file. Raster style is not created]"""
+        if display_name == '': display_name = self.generate_name()
+        source = await self._upload_file(filepath)
+        payload = {
+            "resource": {"cls": "raster_layer", "display_name": display_name, "parent": {"id": group_id}},
+            "raster_layer": {"source": source, "srs": {"id": 3857}}
+        }
+        return await self._create_resource(payload)
+
+    async def upload_qgis_style(self,filepath,layer_id,display_name=''):
+        if display_name == '':
+            display_name=os.path.splitext(filepath)[0]
+        file_upload = await self._upload_file(filepath)
+        payload=dict(
+            resource=dict(cls='qgis_vector_style', parent=dict(id=layer_id), display_name=display_name),
+            qgis_vector_style=dict(file_upload=file_upload)
+        )
+        return await self._create_resource(payload)
+
+    async def replace_qgis_style(self,filepath,style_id):
+        file_upload = await self._upload_file(filepath)
+        payload=dict(qgis_vector_style=dict(id=style_id,file_upload=file_upload))
+        return await self._request('PUT', self.ngw_url+'/api/resource/'+str(style_id), json=payload)
+
+    async def get_layers4webmap(self, group_id,namesource='',layer_adapter='tile',nested=False):
+        """
+        Return list with layers for create_webmap. Subtree is found by one recursive search query,
+        if ngw does not support it, listings of all resources are queried concurrently. See Pyngw.get_layers4webmap
+        """
+        group_id = int(group_id)
+        try:
+            records = [ResourceRecord.from_dict(resource) for resource in await self.search_resource(parent_id=group_id, recursive=True)]
+        except aiohttp.ClientResponseError as e:
+            self.logger.debug('recursive search failed: {e}, list tree'.format(e=e))
+            records = await self._list_tree(group_id, None if nested else 2)
+        return Pyngw._webmap_items(records, group_id, namesource, layer_adapter, nested)
+
+    async def _list_tree(self,resource_id,max_depth,depth=1)->list:
+        # ResourceRecords of subtree, children of same parent are queried concurrently
+        records = [ResourceRecord.from_dict(child) for child in await self.get_childs_resources(resource_id)]
+        if max_depth is None or depth < max_depth:
+            subtrees = await asyncio.gather(*[self._list_tree(record.id, max_depth, depth + 1) for record in records])
+            for subtree in subtrees:
+                records.extend(subtree)
+        return records
+
+    async def create_webmap_from_group(self,group_id,display_name='', layer_adapter = 'tile', nested=False):
+        childrens = await self.get_layers4webmap(group_id, layer_adapter = layer_adapter, nested=nested)
+        return await self.create_webmap(group_id,childrens,display_name)
+
+    async def create_webmap(self,group_id,childrens,display_name=''):
+        """[Create webmap] Arguments same as in Pyngw.create_webmap"""
+        if display_name == '': display_name = 'map ' + self.generate_name()
+        payload = {
+            "resource": {"display_name": display_name, "parent": {"id": group_id}, "cls": "webmap"},
+            "webmap": {"root_item": {"item_type": "root", "children": childrens}}
+        }
+        return await self._create_resource(payload)
+
+    async def download_vector_layer(self,path,layer_id,format='GeoJSON',srs=4326,zipped=False, intersects='',fid=None):
+        """Download vector layer. Arguments same as in Pyngw.download_vector_layer"""
+        assert format in ('GeoJSON','GPKG','CSV')
+        assert zipped in (False,True)
+        url = '{url}/api/resource/{layer_id}/export'.format(url=self.ngw_url, layer_id=layer_id)
+        params={'format':format,
+        'srs':srs,
+        'zipped':'true' if zipped else 'false',
+        'encoding':'UTF-8'}
+        if intersects != '':
+            params['intersects']=intersects
+            params['intersects_srs']=4326
+        if fid is not None:
+            params['fid']=fid
+        self.logger.debug('download vector layer '+url)
+        await self._download('GET', url, path, params=params)
+
+    async def download_qgis_style(self,path,resource_id):
+        """Download qgis vector style"""
+        url = '{url}/api/resource/{resource_id}/qml'.format(url=self.ngw_url, resource_id=resource_id)
+        await self._download('GET', url, path)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResourceCache:
+
+    '''
+    In-process cache for resource and child listing GET queries.
+
+    Size is bounded by maxsize with least recently used eviction, entries older than ttl seconds are not returned.
+    Values are copied on get and set, so callers can change returned dicts without damaging cache.
+    Value read from server is set with generation taken before query, it is dropped if cache was invalidated meanwhile.
+    '''
+
+    def __init__(self, maxsize=1024, ttl=60):
+        assert maxsize > 0
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ return tuple (found, value) """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic() - entry[0] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, copy.deepcopy(entry[1])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, generation=None):
+        """ generation is value of self.generation before value was queried, stale value is not set """
+        value = copy.deepcopy(value)
+        with self._lock:
+            if generation is not None and generation != self.generation: return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def invalidate_resource(self, resource_id):
+        """ drop resource, listing of its children and listings where it is a child """
+        resource_id = str(resource_id)
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(('resource', resource_id), None)
+            self._entries.pop(('childs', resource_id), None)
+            for key in [key for key, entry in self._entries.items() if key[0] == 'childs'
+                        and any(str(element['resource']['id']) == resource_id for element in entry[1])]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self)->dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return dict(hits=self.hits,
+                        misses=self.misses,
+                        hit_rate=self.hits / requests if requests else 0.0,
+                        size=len(self._entries),
+                        maxsize=self.maxsize,
+                        ttl=self.ttl)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+
+class JsonCodec:
+
+    '''
+    JSON encoder and decoder of http bodies with fastest available backend: orjson, ujson or json of standard library.
+    Backend is imported when codec is created, not on import of pyngw.
+
+    loads accepts bytes or str, dumps returns utf-8 bytes without escaping of non-ascii chars.
+    Values which are not JSON types (datetime, Decimal, ...) raise TypeError with every backend, like json= of requests.
+
+    loads_records decodes list of resources or features into records. With msgspec installed only members read by
+    records are decoded, other members of resource are skipped without building dicts.
+    '''
+
+    BACKENDS = ('orjson', 'ujson', 'json')
+
+    def __init__(self, backend=None):
+        """ backend is name from BACKENDS, None selects first installed """
+        for name in ([backend] if backend is not None else self.BACKENDS):
+            if name not in self.BACKENDS: raise ValueError('unknown json backend ' + str(name))
+            try:
+                module = __import__(name)
+            except ImportError:
+                if backend is not None: raise
+                continue
+            self.backend = name
+            break
+        if name == 'orjson':
+            # orjson serializes datetime and dataclass by itself, passthrough makes them fail as in json
+            option = module.OPT_NON_STR_KEYS | module.OPT_PASSTHROUGH_DATETIME | module.OPT_PASSTHROUGH_DATACLASS
+            self.loads = module.loads
+            self.dumps = lambda obj: module.dumps(obj, option=option)
+        elif name == 'ujson':
+            self.loads = module.loads
+            self.dumps = lambda obj: module.dumps(obj, ensure_ascii=False).encode('utf-8')
+        else:
+            self.loads = json.loads
+            self.dumps = lambda obj: json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    def loads_records(self, data, record_type)->list:
+        """ decode JSON list of dicts into list of ResourceRecord or FeatureRecord """
+        decoders = _msgspec_decoders()
+        if decoders is None: return record_type.from_list(self.loads(data))
+        return decoders[record_type](data)
+
+    def __repr__(self):
+        return '<JsonCodec {backend}>'.format(backend=self.backend)
+
+
+_decoders = None
+
+
+def _msgspec_decoders():
+    # decoders of msgspec into typed structs, built on first use. None if msgspec is not installed
+    global _decoders
+    if _decoders is not None: return _decoders or None
+    try:
+        import msgspec
+    except ImportError:
+        _decoders = {}
+        return None
+    from typing import Any, Dict, List, Optional
+
+    class Reference(msgspec.Struct):
+        id: int
+
+    class Resource(msgspec.Struct):
+        id: int
+        cls: str
+        parent: Optional[Reference] = None
+        display_name: Optional[str] = None
+        keyname: Optional[str] = None
+        creation_date: Optional[str] = None
+        owner_user: Optional[Reference] = None
+
+    class Element(msgspec.Struct):
+        resource: Resource
+
+    class Feature(msgspec.Struct):
+        id: int
+        geom: Optional[str] = None
+        fields: Dict[str, Any] = {}
+
+    resource_decoder = msgspec.json.Decoder(List[Element])
+    feature_decoder = msgspec.json.Decoder(List[Feature])
+
+    def resources(data):
+        return [ResourceRecord(resource.id, resource.cls, resource.parent.id if resource.parent is not None else None,
+                               resource.display_name, resource.keyname, resource.creation_date,
+                               resource.owner_user.id if resource.owner_user is not None else None)
+                for resource in (element.resource for element in resource_decoder.decode(data))]
+
+    def features(data):
+        return [FeatureRecord(feature.id, feature.geom, feature.fields) for feature in feature_decoder.decode(data)]
+
+    _decoders = {ResourceRecord: resources, FeatureRecord: features}
+    return _decoders
+
+
+class ResourceRecord:
+
+    '''
+    Compact resource from child listing or search: fields read by pyngw, without nested dicts.
+    to_dict() returns dict in format of ngw REST API with these fields.
+
+    Result is smaller than dicts. Without msgspec records are built from decoded dicts, which adds time to decoding.
+    '''
+
+    __slots__ = ('id', 'cls', 'parent_id', 'display_name', 'keyname', 'creation_date', 'owner_user_id')
+
+    def __init__(self, id, cls, parent_id=None, display_name=None, keyname=None, creation_date=None, owner_user_id=None):
+        self.id = id
+        self.cls = cls
+        self.parent_id = parent_id
+        self.display_name = display_name
+        self.keyname = keyname
+        self.creation_date = creation_date
+        self.owner_user_id = owner_user_id
+
+    @classmethod
+    def from_list(cls, elements:list)->list:
+        """ convert list of decoded dicts to records in place, every dict is released when its record is made """
+        for index, element in enumerate(elements):
+            elements[index] = cls.from_dict(element)
+        return elements
+
+    @classmethod
+    def from_dict(cls, data):
+        resource = data['resource']
+        parent = resource.get('parent')
+        owner_user = resource.get('owner_user')
+        return cls(resource['id'], resource['cls'],
+                   parent['id'] if parent is not None else None,
+                   resource.get('display_name'), resource.get('keyname'), resource.get('creation_date'),
+                   owner_user['id'] if owner_user is not None else None)
+
+    def to_dict(self)->dict:
+        return {'resource': {'id': self.id, 'cls': self.cls,
+                             'parent': {'id': self.parent_id} if self.parent_id is not None else None,
+                             'display_name': self.display_name, 'keyname': self.keyname, 'creation_date': self.creation_date,
+                             'owner_user': {'id': self.owner_user_id} if self.owner_user_id is not None else None}}
+
+    def __eq__(self, other):
+        return isinstance(other, ResourceRecord) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return 'ResourceRecord(id={id}, cls={cls!r}, parent_id={parent_id}, display_name={display_name!r})'.format(
+            id=self.id, cls=self.cls, parent_id=self.parent_id, display_name=self.display_name)
+
+
+class FeatureRecord:
+
+    '''
+    Feature of vector layer: id, geom as wkt, fields dict. to_dict() returns dict of ngw feature API.
+    Decoded like ResourceRecord, see JsonCodec.loads_records.
+    '''
+
+    __slots__ = ('id', 'geom', 'fields')
+
+    def __init__(self, id, geom=None, fields=None):
+        self.id = id
+        self.geom = geom
+        self.fields = fields if fields is not None else {}
+
+    @classmethod
+    def from_list(cls, elements:list)->list:
+        """ convert list of decoded dicts to records in place, every dict is released when its record is made """
+        for index, element in enumerate(elements):
+            elements[index] = cls.from_dict(element)
+        return elements
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data.get('geom'), data.get('fields'))
+
+    def to_dict(self)->dict:
+        return {'id': self.id, 'geom': self.geom, 'fields': self.fields}
+
+    def __eq__(self, other):
+        return isinstance(other, FeatureRecord) and (self.id, self.geom, self.fields) == (other.id, other.geom, other.fields)
+
+    def __repr__(self):
+        return 'FeatureRecord(id={id}, geom={geom!r}, fields={fields!r})'.format(
+            id=self.id, geom=self.geom if self.geom is None or len(self.geom) < 60 else self.geom[:57] + '...', fields=self.fields)
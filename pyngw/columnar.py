@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import struct
+import array
+
+import numpy as np # optional dependency, module is imported by Pyngw.get_features_table
+
+# numpy dtype of NGW field datatypes, dates are read with dt_format=iso
+DTYPES = {
+    'INTEGER': np.int32,
+    'BIGINT': np.int64,
+    'REAL': np.float64,
+    'STRING': object,
+    'DATE': 'datetime64[D]',
+    'TIME': 'timedelta64[s]',
+    'DATETIME': 'datetime64[s]',
+}
+
+_WKB_TYPES = {'POINT': 1, 'LINESTRING': 2, 'POLYGON': 3, 'MULTIPOINT': 4,
+              'MULTILINESTRING': 5, 'MULTIPOLYGON': 6, 'GEOMETRYCOLLECTION': 7}
+
+_WKT_TOKEN = re.compile(r'[A-Za-z]+|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|[(),]')
+
+
+def wkt_to_wkb(wkt)->bytes:
+    """ convert WKT geometry to little-endian ISO WKB. Z and M are supported, SRID prefix of EWKT is skipped """
+    if wkt.upper().startswith('SRID='): wkt = wkt.split(';', 1)[1]
+    tokens = _WKT_TOKEN.findall(wkt)
+    wkb, position = _wkb_geometry(tokens, 0)
+    if position != len(tokens): raise ValueError('unexpected text after geometry in WKT: ' + wkt[:100])
+    return bytes(wkb)
+
+
+def _wkb_geometry(tokens, position, name=None):
+    # name is given for members of multi geometries, which have no type in WKT
+    if name is None:
+        name = tokens[position].upper()
+        if name not in _WKB_TYPES: raise ValueError('unsupported WKT geometry type ' + name)
+        position += 1
+    dimension = ''
+    if position < len(tokens) and tokens[position].upper() in ('Z', 'M', 'ZM'):
+        dimension = tokens[position].upper()
+        position += 1
+    body = bytearray()
+    if position < len(tokens) and tokens[position].upper() == 'EMPTY':
+        position += 1
+        size = 2 + len(dimension)
+        body += struct.pack('<{size}d'.format(size=size), *[float('nan')]*size) if name == 'POINT' else struct.pack('<I', 0)
+    elif name == 'POINT':
+        coordinates, position = _wkt_coordinates(tokens, position)
+        body += struct.pack('<{size}d'.format(size=len(coordinates[0])), *coordinates[0])
+        size = len(coordinates[0])
+    elif name == 'LINESTRING':
+        coordinates, position = _wkt_coordinates(tokens, position)
+        body += _wkb_points(coordinates)
+        size = len(coordinates[0])
+    elif name == 'POLYGON':
+        rings, position = _wkt_list(tokens, position, _wkt_coordinates)
+        body += struct.pack('<I', len(rings))
+        for ring in rings: body += _wkb_points(ring)
+        size = len(rings[0][0])
+    else:
+        # members of multi geometries are written as complete geometries
+        member_type = {'MULTIPOINT': 'POINT', 'MULTILINESTRING': 'LINESTRING', 'MULTIPOLYGON': 'POLYGON'}.get(name)
+
+        def member(tokens, position):
+            if member_type == 'POINT' and tokens[position] != '(':
+                # MULTIPOINT (1 2, 3 4) without parentheses around points
+                end = position
+                while tokens[end] not in (',', ')'): end += 1
+                return _wkb_geometry(['('] + tokens[position:end] + [')'], 0, 'POINT')[0], end
+            return _wkb_geometry(tokens, position, member_type)
+
+        members, position = _wkt_list(tokens, position, member)
+        body += struct.pack('<I', len(members))
+        for wkb in members: body += wkb
+        size = _member_size(members[0])
+    if not dimension: dimension = {3: 'Z', 4: 'ZM'}.get(size, '')
+    code = _WKB_TYPES[name] + {'': 0, 'Z': 1000, 'M': 2000, 'ZM': 3000}[dimension]
+    return struct.pack('<BI', 1, code) + body, position
+
+
+def _member_size(wkb)->int:
+    # number of ordinates of geometry from its ISO WKB type code
+    code = struct.unpack('<I', wkb[1:5])[0]
+    return 2 + {0: 0, 1: 1, 2: 1, 3: 2}[code // 1000]
+
+
+def _wkt_list(tokens, position, parse_item):
+    if tokens[position] != '(': raise ValueError('"(" expected in WKT')
+    position += 1
+    items = list()
+    while True:
+        item, position = parse_item(tokens, position)
+        items.append(item)
+        if tokens[position] == ')': return items, position + 1
+        if tokens[position] != ',': raise ValueError('"," expected in WKT')
+        position += 1
+
+
+def _wkt_coordinates(tokens, position):
+    # (x y, x y z, ...) -> list of tuples
+    def point(tokens, position):
+        end = position
+        while tokens[end] not in (',', ')'): end += 1
+        return tuple(float(value) for value in tokens[position:end]), end
+    return _wkt_list(tokens, position, point)
+
+
+def _wkb_points(coordinates)->bytes:
+    size = len(coordinates[0])
+    return struct.pack('<I', len(coordinates)) + struct.pack('<{count}d'.format(count=len(coordinates)*size),
+                                                              *[value for point in coordinates for value in point])
+
+
+class FeatureTable:
+
+    '''
+    Features of vector layer in columns: numpy arrays instead of dict per feature.
+
+    ids -- int64 array of feature ids
+    columns -- dict keyname: numpy masked array, mask is True for null values
+    wkb_offsets, wkb_buffer -- geometry of feature i is wkb_buffer[wkb_offsets[i]:wkb_offsets[i+1]], like binary array of Arrow.
+                               Empty slice means null geometry
+    x, y -- float64 arrays of point coordinates, for geometry='xy'
+    '''
+
+    def __init__(self, ids, columns, wkb_offsets=None, wkb_buffer=None, x=None, y=None):
+        self.ids = ids
+        self.columns = columns
+        self.wkb_offsets = wkb_offsets
+        self.wkb_buffer = wkb_buffer
+        self.x = x
+        self.y = y
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __repr__(self):
+        return '<FeatureTable {count} features, columns: {columns}>'.format(count=len(self), columns=', '.join(self.columns))
+
+    @property
+    def nbytes(self)->int:
+        """ size of arrays, python objects of string columns are not counted """
+        arrays = [self.ids, self.wkb_offsets, self.wkb_buffer, self.x, self.y]
+        arrays += [column.data for column in self.columns.values()] + [column.mask for column in self.columns.values()]
+        return sum(element.nbytes for element in arrays if element is not None)
+
+    def wkb(self, index):
+        """ WKB bytes of geometry of feature by position in table, None for null geometry """
+        start, end = self.wkb_offsets[index], self.wkb_offsets[index + 1]
+        return self.wkb_buffer[start:end].tobytes() if end > start else None
+
+    @classmethod
+    def from_features(cls, features, fields, geometry='wkb', capacity=0):
+        """[Fill table from iterable of feature dicts of ngw feature API]
+
+        Arguments:
+            features {iterable} -- [dicts {"id", "geom", "fields"}]
+            fields {list} -- [tuples (keyname, ngw datatype)]
+
+        Keyword Arguments:
+            geometry {str} -- ['wkb', 'xy' for point layers, or None] (default: {'wkb'})
+            capacity {int} -- [expected number of features, arrays are allocated once if it is right] (default: {0})
+        """
+        assert geometry in ('wkb', 'xy', None)
+        capacity = max(capacity, 1)
+        ids = np.empty(capacity, dtype=np.int64)
+        data = {keyname: np.empty(capacity, dtype=DTYPES.get(datatype, object)) for keyname, datatype in fields}
+        masks = {keyname: np.zeros(capacity, dtype=bool) for keyname, datatype in fields}
+        converters = {keyname: _converter(datatype) for keyname, datatype in fields}
+        offsets = array.array('q', [0])
+        buffer = bytearray()
+        x = np.empty(capacity, dtype=np.float64) if geometry == 'xy' else None
+        y = np.empty(capacity, dtype=np.float64) if geometry == 'xy' else None
+
+        count = 0
+        for feature in features:
+            if count == capacity:
+                # arrays grow by half, so total copy cost stays linear
+                capacity = capacity + capacity // 2 + 1
+                ids = np.resize(ids, capacity)
+                data = {keyname: np.resize(column, capacity) for keyname, column in data.items()}
+                masks = {keyname: np.resize(mask, capacity) for keyname, mask in masks.items()}
+                if x is not None: x, y = np.resize(x, capacity), np.resize(y, capacity)
+            ids[count] = feature['id']
+            values = feature['fields']
+            for keyname, column in data.items():
+                value = values.get(keyname)
+                if value is None:
+                    masks[keyname][count] = True
+                else:
+                    column[count] = converters[keyname](value)
+                    masks[keyname][count] = False
+            wkt = feature.get('geom')
+            if geometry == 'wkb':
+                if wkt is not None: buffer += wkt_to_wkb(wkt)
+                offsets.append(len(buffer))
+            elif geometry == 'xy':
+                x[count], y[count] = _point_xy(wkt)
+            count += 1
+
+        columns = dict()
+        for keyname, column in data.items():
+            column = column[:count]
+            if column.dtype == object: column = column.copy()
+            mask = masks[keyname][:count]
+            # null values of object arrays are None, not garbage of np.empty
+            if column.dtype == object: column[mask] = None
+            columns[keyname] = np.ma.MaskedArray(column, mask=mask.copy())
+        return cls(ids[:count].copy(), columns,
+                   wkb_offsets=np.frombuffer(offsets, dtype=np.int64) if geometry == 'wkb' else None,
+                   wkb_buffer=np.frombuffer(buffer, dtype=np.uint8) if geometry == 'wkb' else None,
+                   x=x[:count].copy() if x is not None else None,
+                   y=y[:count].copy() if y is not None else None)
+
+    def to_pandas(self):
+        """ pandas DataFrame indexed by feature id, nullable columns use pandas extension arrays. Geometry is column of WKB bytes or x, y columns """
+        try:
+            import pandas as pd
+        except ImportError as e:
+            raise ModuleNotFoundError('FeatureTable.to_pandas require pandas') from e
+        frame = dict()
+        for keyname, column in self.columns.items():
+            if column.dtype.kind in 'iu':
+                frame[keyname] = pd.arrays.IntegerArray(column.data, column.mask.copy())
+            elif column.dtype.kind == 'f':
+                frame[keyname] = pd.arrays.FloatingArray(column.data, column.mask.copy())
+            elif column.dtype.kind in 'mM':
+                frame[keyname] = np.where(column.mask, np.array('NaT', dtype=column.dtype), column.data)
+            else:
+                frame[keyname] = column.data
+        if self.wkb_offsets is not None:
+            frame['geometry'] = np.array([self.wkb(index) for index in range(len(self))], dtype=object)
+        if self.x is not None:
+            frame['x'], frame['y'] = self.x, self.y
+        return pd.DataFrame(frame, index=pd.Index(self.ids, name='id'))
+
+    def to_arrow(self):
+        """ pyarrow Table with id column, geometry is large_binary WKB column made without copy of buffer """
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ModuleNotFoundError('FeatureTable.to_arrow require pyarrow') from e
+        arrays = {'id': pa.array(self.ids)}
+        for keyname, column in self.columns.items():
+            arrays[keyname] = pa.array(column.data, mask=column.mask)
+        if self.wkb_offsets is not None:
+            validity = self.wkb_offsets[1:] > self.wkb_offsets[:-1]
+            arrays['geometry'] = pa.LargeBinaryArray.from_buffers(pa.large_binary(), len(self),
+                [pa.array(validity).buffers()[1], pa.py_buffer(self.wkb_offsets), pa.py_buffer(self.wkb_buffer)])
+        if self.x is not None:
+            arrays['x'], arrays['y'] = pa.array(self.x), pa.array(self.y)
+        return pa.table(arrays)
+
+
+def _converter(datatype):
+    if datatype in ('INTEGER', 'BIGINT'): return int
+    if datatype == 'REAL': return float
+    if datatype in ('DATE', 'DATETIME'): return _datetime
+    if datatype == 'TIME': return _time
+    return lambda value: value
+
+
+def _datetime(value):
+    # iso string, or dict {year, month, day, hour, minute, second} of default dt_format
+    if isinstance(value, dict):
+        value = '{year:04d}-{month:02d}-{day:02d}T{hour:02d}:{minute:02d}:{second:02d}'.format(
+            year=value['year'], month=value['month'], day=value['day'],
+            hour=value.get('hour', 0), minute=value.get('minute', 0), second=value.get('second', 0))
+    return np.datetime64(value)
+
+
+def _time(value):
+    if isinstance(value, dict):
+        return np.timedelta64(value['hour'] * 3600 + value['minute'] * 60 + value['second'], 's')
+    hours, minutes, seconds = value.split(':')
+    return np.timedelta64(int(hours) * 3600 + int(minutes) * 60 + int(float(seconds)), 's')
+
+
+def _point_xy(wkt):
+    if wkt is None: return np.nan, np.nan
+    tokens = _WKT_TOKEN.findall(wkt)
+    if tokens[0].upper() != 'POINT': raise ValueError("geometry='xy' is only for point layers, got " + tokens[0])
+    numbers = [token for token in tokens[1:] if token not in ('(', ')') and not token.isalpha()]
+    if not numbers: return np.nan, np.nan
+    return float(numbers[0]), float(numbers[1])
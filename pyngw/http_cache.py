@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+
+class HttpCache:
+
+    '''
+    Persistent cache of GET response bodies in directory, revalidated by conditional queries.
+
+    Entry is body file and meta file with url and validators (ETag, Last-Modified) of response.
+    Query of cached url is sent with If-None-Match and If-Modified-Since, on 304 Not Modified body is taken from cache.
+    Responses without validators are not cached.
+    Size of bodies is bounded by max_bytes with least recently used eviction, order of use is kept by mtime of meta files,
+    so it survives restart of process.
+    '''
+
+    def __init__(self, directory, max_bytes=256*1024*1024):
+        assert max_bytes > 0
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        entries = list()
+        for name in os.listdir(directory):
+            if not name.endswith('.meta'): continue
+            key = name[:-len('.meta')]
+            try:
+                entries.append((os.path.getmtime(self._meta_path(key)), key, os.path.getsize(self._body_path(key))))
+            except OSError:
+                # body was not written or was removed
+                self._remove_files(key)
+        self._entries = OrderedDict((key, size) for mtime, key, size in sorted(entries))
+        self._size = sum(self._entries.values())
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def key(url, params=None)->str:
+        """ name of entry for url with query params """
+        if params:
+            url = url + '?' + urlencode(sorted((str(name), str(value)) for name, value in params.items()))
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, key + '.meta')
+
+    def _body_path(self, key):
+        return os.path.join(self.directory, key + '.body')
+
+    def validators(self, key)->dict:
+        """ headers of conditional query for entry, empty dict if url is not cached """
+        with self._lock:
+            if key not in self._entries: return {}
+        try:
+            with open(self._meta_path(key)) as fp:
+                meta = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+        headers = dict()
+        if meta.get('etag'): headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'): headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def hit(self, key):
+        """ mark entry as used after 304 response, return path of body or None if entry was evicted """
+        with self._lock:
+            if key not in self._entries or not os.path.exists(self._body_path(key)):
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(self._meta_path(key))
+        except OSError:
+            pass
+        return self._body_path(key)
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def store(self, key, url, headers, data=None, path=None):
+        """[save body of 200 response with its validators]
+
+        Arguments:
+            key {str} -- [name of entry]
+            url {str} -- [url of query, saved for debug]
+            headers {dict} -- [headers of response]
+
+        Keyword Arguments:
+            data {bytes} -- [body] (default: {None})
+            path {str} -- [file with body, copied into cache] (default: {None})
+        """
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if etag is None and last_modified is None: return
+        size = len(data) if data is not None else os.path.getsize(path)
+        if size > self.max_bytes: return
+
+        # files are written under temp names and renamed, so readers never see partial entry
+        suffix = '.{pid}.{thread}.tmp'.format(pid=os.getpid(), thread=threading.get_ident())
+        body_tmp = self._body_path(key) + suffix
+        if data is not None:
+            with open(body_tmp, 'wb') as fp:
+                fp.write(data)
+        else:
+            shutil.copyfile(path, body_tmp)
+        meta_tmp = self._meta_path(key) + suffix
+        with open(meta_tmp, 'w') as fp:
+            json.dump(dict(url=url, etag=etag, last_modified=last_modified, size=size), fp)
+
+        with self._lock:
+            os.replace(body_tmp, self._body_path(key))
+            os.replace(meta_tmp, self._meta_path(key))
+            self._size += size - self._entries.get(key, 0)
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self._remove_files(key)
+
+    def _remove_files(self, key):
+        for path in (self._meta_path(key), self._body_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove_files(key)
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self)->dict:
+        """ return hits (304 responses served from cache), misses, number of entries and bytes of bodies """
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, entries=len(self._entries), bytes=self._size)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_ID_SEGMENT = re.compile(r'/(\d+|[0-9a-f]{32})(?=/|$)')
+
+
+def endpoint_template(path)->str:
+    """ '/api/resource/123/feature/?limit=10' -> '/api/resource/{id}/feature/' """
+    path = path.split('?')[0]
+    return _ID_SEGMENT.sub(lambda match: '/{upload_id}' if len(match.group(1)) == 32 and not match.group(1).isdigit() else '/{id}', path)
+
+
+class Metrics:
+
+    '''
+    Counters and latency histograms of http queries, aggregated by
+    public Pyngw method (operation), http method, endpoint template and response status.
+
+    hook, if given, is called for every query with dict of its measurements.
+    '''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, hook=None):
+        self.buckets = tuple(sorted(buckets))
+        self.hook = hook
+        self._series = dict()
+        self._lock = threading.Lock()
+
+    def record(self, operation, method, endpoint, status, latency, request_bytes=0, response_bytes=0):
+        key = (operation, method, endpoint, str(status))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = dict(count=0, latency_sum=0.0, buckets=[0]*len(self.buckets), request_bytes=0, response_bytes=0)
+            series['count'] += 1
+            series['latency_sum'] += latency
+            series['request_bytes'] += request_bytes
+            series['response_bytes'] += response_bytes
+            for index, bound in enumerate(self.buckets):
+                if latency <= bound:
+                    series['buckets'][index] += 1
+                    break
+        if self.hook is not None:
+            self.hook(dict(operation=operation, method=method, endpoint=endpoint, status=status, latency=latency,
+                           request_bytes=request_bytes, response_bytes=response_bytes))
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self)->dict:
+        """ return dict with list of series, and totals by operation """
+        with self._lock:
+            items = [(key, dict(series, buckets=list(series['buckets']))) for key, series in self._series.items()]
+        queries = list()
+        operations = dict()
+        for (operation, method, endpoint, status), series in sorted(items):
+            cumulative = 0
+            buckets = dict()
+            for bound, count in zip(self.buckets, series['buckets']):
+                cumulative += count
+                buckets[bound] = cumulative
+            queries.append(dict(operation=operation, method=method, endpoint=endpoint, status=status,
+                                count=series['count'], latency_sum=series['latency_sum'], latency_buckets=buckets,
+                                request_bytes=series['request_bytes'], response_bytes=series['response_bytes']))
+            total = operations.setdefault(operation, dict(count=0, errors=0, latency_sum=0.0, request_bytes=0, response_bytes=0))
+            total['count'] += series['count']
+            total['latency_sum'] += series['latency_sum']
+            total['request_bytes'] += series['request_bytes']
+            total['response_bytes'] += series['response_bytes']
+            if not status.isdigit() or int(status) >= 400: total['errors'] += series['count']
+        return dict(queries=queries, operations=operations)
+
+    def prometheus(self)->str:
+        """ return metrics in Prometheus text exposition format """
+        snapshot = self.snapshot()
+        lines = ['# HELP pyngw_requests_total HTTP queries sent by pyngw',
+                 '# TYPE pyngw_requests_total counter']
+        for query in snapshot['queries']:
+            lines.append('pyngw_requests_total{{{labels}}} {value}'.format(labels=self._labels(query), value=query['count']))
+        lines += ['# HELP pyngw_request_duration_seconds Latency of HTTP queries sent by pyngw',
+                  '# TYPE pyngw_request_duration_seconds histogram']
+        for query in snapshot['queries']:
+            labels = self._labels(query)
+            for bound, count in query['latency_buckets'].items():
+                lines.append('pyngw_request_duration_seconds_bucket{{{labels},le="{bound}"}} {value}'.format(labels=labels, bound=bound, value=count))
+            lines.append('pyngw_request_duration_seconds_bucket{{{labels},le="+Inf"}} {value}'.format(labels=labels, value=query['count']))
+            lines.append('pyngw_request_duration_seconds_sum{{{labels}}} {value}'.format(labels=labels, value=query['latency_sum']))
+            lines.append('pyngw_request_duration_seconds_count{{{labels}}} {value}'.format(labels=labels, value=query['count']))
+        for name, key, help_text in (('pyngw_request_bytes_total', 'request_bytes', 'Bytes sent in HTTP query bodies'),
+                                     ('pyngw_response_bytes_total', 'response_bytes', 'Bytes received in HTTP response bodies')):
+            lines += ['# HELP {name} {help_text}'.format(name=name, help_text=help_text), '# TYPE {name} counter'.format(name=name)]
+            for query in snapshot['queries']:
+                lines.append('{name}{{{labels}}} {value}'.format(name=name, labels=self._labels(query), value=query[key]))
+        return '\n'.join(lines) + '\n'
+
+    def _labels(self, query)->str:
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return ','.join('{key}="{value}"'.format(key=key, value=escape(query[key])) for key in ('operation', 'method', 'endpoint', 'status'))
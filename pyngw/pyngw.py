@@ -1,21 +1,112 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import requests
 import os
 import datetime
-import shutil
 import logging
 import time
 
-import pprint
 import json
 import fnmatch
+import hashlib
+import base64
+import threading
+import contextvars
+import sys
+import re
+from urllib.parse import urljoin
 from warnings import warn
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from itertools import islice, chain
+from collections import namedtuple
 
-from tusclient.client import TusClient # requirement in setup.py
+from .cache import ResourceCache
+from .retry import RetryPolicy, AdaptiveLimiter
+from .metrics import Metrics, endpoint_template
+from .codec import JsonCodec, ResourceRecord, FeatureRecord
+from .singleflight import SingleFlight
 
-pp = pprint.PrettyPrinter(indent=4)
+__all__ = ['Pyngw', 'BulkResult', 'TreeRecord', 'ResourceRecord', 'FeatureRecord', 'JsonCodec']
+
+# requests and gdal are imported in methods on first use, so import of pyngw stays fast
+
+
+class BulkResult:
+
+    '''
+    Result of bulk operation, returned instead of raising on first failed query.
+
+    ids -- list of created ids in input order, None for items which was not created
+    succeeded -- list of keys of processed parts (chunk offsets, resource ids)
+    failed -- dict, key of part: exception
+    timings -- dict, key of part: seconds spent on query
+    '''
+
+    def __init__(self):
+        self.ids = list()
+        self.succeeded = list()
+        self.failed = dict()
+        self.timings = dict()
+
+    @property
+    def ok(self)->bool:
+        return len(self.failed) == 0
+
+    def __repr__(self):
+        return '<BulkResult succeeded={succeeded} failed={failed}>'.format(succeeded=len(self.succeeded), failed=len(self.failed))
+
+
+_operation = contextvars.ContextVar('pyngw_operation', default=None)
+
+
+class _OperationExecutor(ThreadPoolExecutor):
+    # thread pool whose queries are counted in metrics for public method which created the pool
+    def __init__(self, max_workers, operation=None):
+        super().__init__(max_workers=max_workers)
+        self.operation = operation
+
+    def submit(self, fn, *args, **kwargs):
+        if self.operation is None: return super().submit(fn, *args, **kwargs)
+        return super().submit(self._run, fn, args, kwargs)
+
+    def _run(self, fn, args, kwargs):
+        token = _operation.set(self.operation)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _operation.reset(token)
+
+
+class _StreamSink:
+    # write-only file object for zipfile and encoders, written bytes are taken by generator of request body
+    def __init__(self):
+        self.chunks = list()
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self)->bytes:
+        data = b''.join(self.chunks)
+        self.chunks = list()
+        self.size = 0
+        return data
+
+
+class _UploadExpired(Exception):
+    # tus upload is gone on server, error is original exception
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+
+TreeRecord = namedtuple('TreeRecord', ['id', 'cls', 'parent_id', 'display_name'])
+TreeRecord.__doc__ = 'Resource found by Pyngw.walk_tree'
 
 
 class Pyngw:
@@ -29,13 +120,48 @@ class Pyngw:
 
     '''
 
-    def __init__(self,ngw_url='https://sandbox.nextgis.com',login=None,password=None,log_level='ERROR'):
+    MANIFEST_FILENAME = '.pyngw_manifest.json'
+
+    def __init__(self,ngw_url='https://sandbox.nextgis.com',login=None,password=None,log_level=None,
+            pool_connections=10,
+            pool_maxsize=10,
+            timeout=(10, 600),
+            cache_size=0,
+            cache_ttl=60,
+            upload_chunk_size=16*1024*1024,
+            upload_workers=1,
+            max_retries=5,
+            adaptive_concurrency=True,
+            latency_target=None,
+            metrics=False,
+            metrics_hook=None,
+            json_backend=None,
+            http_cache_dir=None,
+            http_cache_size=256*1024*1024,
+            coalesce_gets=True):
         """[create api instance with stored login and passwords]
 
         Keyword Arguments:
             ngw_url {str} -- [url of ngw instanse. Must not ended with slash symbol] (default: {'https://sandbox.nextgis.com'})
             login {str} -- [login] (default: {'administrator'})
             password {str} -- [password] (default: {'admin'})
+            log_level {str} -- [level of pyngw logger, None keeps level configured by application. Root logger and handlers are not changed] (default: {None})
+            pool_connections {int} -- [number of connection pools cached by http session] (default: {10})
+            pool_maxsize {int} -- [max number of keep-alive connections to ngw host] (default: {10})
+            timeout {float, tuple} -- [default (connect, read) timeout in seconds for every query] (default: {(10, 600)})
+            cache_size {int} -- [max number of cached resources and child listings, 0 disables cache] (default: {0})
+            cache_ttl {float} -- [seconds while cached resource is used without query to ngw] (default: {60})
+            upload_chunk_size {int} -- [bytes in one chunk of resumable upload, smaller files are uploaded with one PUT] (default: {16 MiB})
+            upload_workers {int} -- [number of file parts uploaded concurrently, if ngw supports tus concatenation] (default: {1})
+            max_retries {int} -- [repeats of query on 429, 502, 503, 504 and timeouts, see RetryPolicy] (default: {5})
+            adaptive_concurrency {bool} -- [limit queries in flight between 1 and pool_maxsize, adjusted by errors and latency] (default: {True})
+            latency_target {float} -- [seconds, slower queries reduce concurrency limit like errors] (default: {None})
+            metrics {bool} -- [collect counters and latency histograms of queries in self.metrics] (default: {False})
+            metrics_hook {callable} -- [called with dict of measurements for every query, enables metrics] (default: {None})
+            json_backend {str} -- [orjson, ujson or json for encoding and decoding of queries, None selects fastest installed] (default: {None})
+            http_cache_dir {str} -- [directory of persistent cache of resources, qml styles and exports, revalidated by ETag and Last-Modified] (default: {None})
+            http_cache_size {int} -- [max bytes of bodies in http cache, least recently used are removed] (default: {256 MiB})
+            coalesce_gets {bool} -- [identical GET queries from concurrent threads are sent once and share response] (default: {True})
         """
         self.ngw_url=ngw_url
         self.login=login
@@ -46,51 +172,370 @@ class Pyngw:
             self.ngw_creds=(self.login,self.password)
         self.log_level = log_level
 
-        if log_level == 'DEBUG': logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
-        if log_level == 'ERROR': logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.ERROR)
-        if log_level == 'INFO': logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
         if self.ngw_url.endswith('/'): self.ngw_url = self.ngw_url.rstrip('/')
         if '.nextgis.com' in self.ngw_url.lower():
             if not self.ngw_url.lower().startswith('https://'): raise ValueError('while connect to nextgis.com url should use HTTPS ')
 
+        # logger is shared by all instances, its level is changed only when caller asks for it
         self.logger = logging.getLogger(__name__)
+        if log_level is not None: self.logger.setLevel(log_level)
+
+        import requests
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.auth = self.ngw_creds
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.cache = ResourceCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self.http_cache = None
+        if http_cache_dir is not None:
+            from .http_cache import HttpCache
+            self.http_cache = HttpCache(http_cache_dir, http_cache_size)
+
+        self.upload_chunk_size = upload_chunk_size
+        self.upload_workers = upload_workers
+        self._upload_resume_dir = None
+
+        self.retry_policy = RetryPolicy(max_retries=max_retries)
+        self.limiter = AdaptiveLimiter(initial=pool_maxsize, maximum=pool_maxsize, latency_target=latency_target) if adaptive_concurrency else None
+
+        self.metrics = Metrics(hook=metrics_hook) if metrics or metrics_hook is not None else None
+
+        self.codec = JsonCodec(json_backend)
+
+        self.single_flight = SingleFlight() if coalesce_gets else None
+        self._recursive_search = None
+
+    @property
+    def upload_resume_dir(self)->str:
+        """ directory with state of broken uploads, default is pyngw_uploads in system temp directory """
+        if self._upload_resume_dir is None:
+            import tempfile
+            self._upload_resume_dir = os.path.join(tempfile.gettempdir(), 'pyngw_uploads')
+        return self._upload_resume_dir
+
+    @upload_resume_dir.setter
+    def upload_resume_dir(self, path):
+        self._upload_resume_dir = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """ close keep-alive connections of http session """
+        self.session.close()
+
+    def _request(self, method, url, **kwargs):
+        """ send query through shared http session, with default timeout and auth.
+        Query is repeated by retry_policy, number of queries in flight is limited by limiter.
+        Identical concurrent GET queries are sent once, see coalesce_gets """
+        kwargs.setdefault('timeout', self.timeout)
+        payload = kwargs.get('json')
+        if payload is not None:
+            kwargs['data'] = self.codec.dumps(kwargs.pop('json'))
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **{'Content-Type': 'application/json'})
+        if self.cache is None or method == 'GET': return self._coalesced_request(method, url, kwargs)
+        # cache is invalidated before write, and after it: concurrent GET could put old value back while write is sent
+        self._invalidate_cache(url, payload)
+        try:
+            return self._coalesced_request(method, url, kwargs)
+        finally:
+            self._invalidate_cache(url, payload)
+
+    def _coalesced_request(self, method, url, kwargs):
+        if self.single_flight is None: return self._send_request(method, url, kwargs)
+
+        if method != 'GET':
+            try:
+                return self._send_request(method, url, kwargs)
+            finally:
+                # later GET queries do not join queries started before this change
+                self.single_flight.invalidate()
+        if kwargs.get('stream') or kwargs.get('data') is not None: return self._send_request(method, url, kwargs)
+        # body of not streamed response is read, so response is shared by waiting threads
+        params = kwargs.get('params')
+        key = (url, repr(sorted(params.items()) if isinstance(params, dict) else params),
+               repr(sorted((kwargs.get('headers') or {}).items())))
+        return self.single_flight.do(key, lambda: self._send_request(method, url, kwargs))
+
+    def _send_request(self, method, url, kwargs):
+        import requests
+        # file object body is rewinded before repeat, generator body can not be repeated
+        body = kwargs.get('data')
+        rewind = body.tell() if hasattr(body, 'seek') and hasattr(body, 'tell') else None
+        replayable = body is None or isinstance(body, (bytes, str, dict, list, tuple)) or rewind is not None
+
+        attempt = 0
+        while True:
+            if self.limiter is not None: self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if self.limiter is not None: self.limiter.release(False, time.perf_counter() - started)
+                if self.metrics is not None: self._record_metrics(method, url, type(e).__name__, time.perf_counter() - started, body, None, kwargs)
+                if not replayable or not self.retry_policy.should_retry(method, attempt): raise
+                delay = self.retry_policy.delay(attempt)
+                reason = str(e)
+            else:
+                ok = response.status_code not in RetryPolicy.RETRY_STATUSES
+                if self.limiter is not None: self.limiter.release(ok, time.perf_counter() - started)
+                if self.metrics is not None: self._record_metrics(method, url, response.status_code, time.perf_counter() - started, body, response, kwargs)
+                if ok or not replayable or not self.retry_policy.should_retry(method, attempt, response.status_code): return response
+                delay = self.retry_policy.delay(attempt, response.headers.get('Retry-After'))
+                reason = str(response.status_code)
+                response.close()
+            self.logger.warning('{method} {url} failed: {reason}, retry in {delay:.1f} s'.format(method=method, url=url, reason=reason, delay=delay))
+            time.sleep(delay)
+            if rewind is not None: body.seek(rewind)
+            attempt += 1
+
+    def _cached_get(self, url, params=None, path=None):
+        """ GET body through http cache, with conditional query for cached url.
+        Body is written to path or returned as bytes if path is None """
+        if self.single_flight is None or path is not None:
+            return self._cached_fetch(url, params, path)
+        # body returned as bytes is read at once, such calls are coalesced above the cache,
+        # so only one thread reads validators, counts hit or miss and stores the entry
+        key = ('cached', url, repr(sorted(params.items()) if isinstance(params, dict) else params))
+        return self.single_flight.do(key, lambda: self._cached_fetch(url, params, path))
+
+    def _cached_fetch(self, url, params, path):
+        # queries are sent past _coalesced_request, _cached_get coalesces whole fetch
+        key = self.http_cache.key(url, params) if self.http_cache is not None else None
+        headers = self.http_cache.validators(key) if key is not None else {}
+        response = self._send_request('GET', url, dict(params=params, headers=headers, stream=path is not None, timeout=self.timeout))
+        if response.status_code == 304:
+            response.close()
+            cached = self.http_cache.hit(key)
+            if cached is None:
+                # entry was evicted after validators were read
+                response = self._send_request('GET', url, dict(params=params, stream=path is not None, timeout=self.timeout))
+            elif path is not None:
+                import shutil
+                shutil.copyfile(cached, path)
+                return None
+            else:
+                with open(cached, 'rb') as fp:
+                    return fp.read()
+        response.raise_for_status()
+        if key is not None: self.http_cache.miss()
+
+        if path is None:
+            data = response.content
+            if key is not None: self.http_cache.store(key, response.url, response.headers, data=data)
+            return data
+        # iter_content decodes gzip and deflate content-encoding, response.raw does not
+        with open(path, 'wb') as out_file:
+            for chunk in response.iter_content(chunk_size=1024*1024):
+                out_file.write(chunk)
+        response.close()
+        if key is not None: self.http_cache.store(key, response.url, response.headers, path=path)
+        return None
+
+    def coalesce_stats(self)->dict:
+        """ return GET queries sent and shared (saved by coalescing of concurrent identical queries), or None if disabled """
+        if self.single_flight is None: return None
+        return self.single_flight.stats()
+
+    def http_cache_stats(self)->dict:
+        """ return hits (304 responses), misses, entries and bytes of http cache, or None if it is disabled """
+        if self.http_cache is None: return None
+        return self.http_cache.stats()
+
+    def _decode(self, response):
+        """ body of response decoded by codec """
+        return self.codec.loads(response.content)
+
+    def _record_metrics(self, method, url, status, latency, body, response, kwargs):
+        if response is not None:
+            request_bytes = int(response.request.headers.get('Content-Length') or 0)
+            if kwargs.get('stream'):
+                # body of streamed response is not read yet
+                response_bytes = int(response.headers.get('Content-Length') or 0)
+            else:
+                response_bytes = len(response.content)
+        else:
+            request_bytes = len(body) if isinstance(body, (bytes, str)) else 0
+            response_bytes = 0
+        path = url[len(self.ngw_url):] if url.startswith(self.ngw_url) else url
+        self.metrics.record(self._operation_name(), method, endpoint_template(path), status, latency, request_bytes, response_bytes)
+
+    def _operation_name(self)->str:
+        # outermost public method of this instance in call stack, or method which started thread pool
+        operation = _operation.get()
+        if operation is not None: return operation
+        public_methods = type(self)._public_methods()
+        frame = sys._getframe(1)
+        while frame is not None:
+            if frame.f_code.co_name in public_methods and frame.f_locals.get('self') is self:
+                operation = frame.f_code.co_name
+            frame = frame.f_back
+        return operation or 'unknown'
+
+    @classmethod
+    def _public_methods(cls)->set:
+        if '_public_method_names' not in cls.__dict__:
+            cls._public_method_names = set(name for name in dir(cls) if not name.startswith('_') and callable(getattr(cls, name)))
+        return cls._public_method_names
+
+    def _executor(self, workers)->ThreadPoolExecutor:
+        """ thread pool for concurrent queries, which keeps metrics attribution of calling method """
+        return _OperationExecutor(workers, self._operation_name() if self.metrics is not None else None)
+
+    def _invalidate_cache(self, url, payload):
+        """ drop cached resources changed by create, update or delete query """
+        path = url[len(self.ngw_url):].split('?')[0]
+        if not path.startswith('/api/resource/'): return
+        resource_id = path[len('/api/resource/'):].rstrip('/')
+        if resource_id.isdigit():
+            self.cache.invalidate_resource(resource_id)
+        elif resource_id != '':
+            # feature, file and other sub-resource queries do not change resource metadata
+            return
+        parent = (payload or {}).get('resource', {}).get('parent') if isinstance(payload, dict) else None
+        if parent is not None: self.cache.invalidate(('childs', str(parent['id'])))
+
+    def cache_stats(self)->dict:
+        """ return hits, misses and size of resource cache, or None if cache is disabled """
+        if self.cache is None: return None
+        return self.cache.stats()
 
     def search_group_by_name(self,name,group_id=0)->int:
         warn('This is deprecated. Use get_resource_id_by_name or search_resource_by_name', DeprecationWarning, stacklevel=2)
         
         GROUPNAME = name
 
-        url=self.ngw_url+'/api/resource/?parent='+str(group_id)
-        request = requests.get(url, auth=self.ngw_creds)
-        request.raise_for_status()
-        response = request.json()
+        response = self.search_resource(display_name=GROUPNAME,cls='resource_group',parent_id=group_id)
 
         for element in response:
-            if element['resource']['cls']=='resource_group' and element['resource']['display_name']==GROUPNAME:
+            if element['resource']['display_name']==GROUPNAME:
                 return element['resource']['id']
         return None
     
-    def search_resource(self)->list:
-        raise NotImplementedError
+    def search_resource(self,display_name=None,cls=None,keyname=None,parent_id=None,owner_user_id=None,recursive=False,**params)->list:
         """
-        Method name for wrapper of ngw api search method
+        Wrapper for ngw api search method /api/resource/search/. Resources are filtered on server, only found resources are transferred.
+
+        Keyword Arguments:
+            display_name {str} -- [exact name of resource] (default: {None})
+            cls {str} -- [cls of resource, for example 'vector_layer'] (default: {None})
+            keyname {str} -- [keyname of resource] (default: {None})
+            parent_id {int} -- [search only in children of this resource] (default: {None})
+            owner_user_id {int} -- [id of owner user] (default: {None})
+            recursive {bool} -- [with parent_id, search in whole subtree instead of direct children. Parent chain of results is checked,
+                ancestors which are not in results are queried] (default: {False})
+            params -- [other GET params passed to /search as is, for example display_name__ilike='park%']
+
+        Returns:
+            [list] -- [list of dicts, same as from get_childs_resources]
         """
+        query = dict(params)
+        if display_name is not None: query['display_name'] = display_name
+        if cls is not None: query['cls'] = cls
+        if keyname is not None: query['keyname'] = keyname
+        if owner_user_id is not None: query['owner_user__id'] = owner_user_id
+        if parent_id is not None:
+            if recursive:
+                query['parent_id__recursive'] = parent_id
+            else:
+                query['parent_id'] = parent_id
+
+        request = self._request('GET', self.ngw_url+'/api/resource/search/', params=query)
+        request.raise_for_status()
+        response = self._decode(request)
+
+        # old ngw versions ignore filters they do not know, so check result again
+        results = list()
+        for element in response:
+            if display_name is not None and element['resource']['display_name'] != display_name: continue
+            if cls is not None and element['resource']['cls'] != cls: continue
+            if keyname is not None and element['resource'].get('keyname') != keyname: continue
+            if parent_id is not None and not recursive:
+                if element['resource']['parent'] is None or int(element['resource']['parent']['id']) != int(parent_id): continue
+            results.append(element)
+        if parent_id is not None and recursive and not self._recursive_search_supported():
+            # server ignores recursive filter: parent chain of every result should lead to parent_id. Ancestors not found by search are queried
+            parents = self._parents_of(results)
+            while True:
+                results, unknown = self._split_by_ancestor(results, int(parent_id), parents)
+                if len(unknown) == 0: break
+                with self._executor(min(8, len(unknown))) as executor:
+                    parents.update(zip(unknown, executor.map(self._parent_id_or_none, unknown)))
+        return results
+
+    def _recursive_search_supported(self)->bool:
+        """ True if server applies parent_id__recursive filter of search. Probed once per instance """
+        if self._recursive_search is None:
+            import requests
+            # no resource is under id -1, so server with filter returns nothing, server which ignores it returns top level resources
+            response = self._request('GET', self.ngw_url+'/api/resource/search/', params={'parent_id': 0, 'parent_id__recursive': -1})
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                # invalid value of known filter is rejected
+                self._recursive_search = response.status_code < 500
+                if not self._recursive_search: raise
+            else:
+                self._recursive_search = len(self._decode(response)) == 0
+            self.logger.debug('recursive search supported: {supported}'.format(supported=self._recursive_search))
+        return self._recursive_search
+
+    @staticmethod
+    def _parents_of(elements)->dict:
+        return dict((int(element['resource']['id']), int(element['resource']['parent']['id']) if element['resource']['parent'] else None)
+            for element in elements)
+
+    @staticmethod
+    def _split_by_ancestor(elements, ancestor_id, parents)->tuple:
+        # drop elements whose parent chain does not lead to ancestor_id.
+        # Elements with unknown parent in chain are kept, ids of these parents are returned
+        kept = list()
+        unknown = set()
+        for element in elements:
+            parent = element['resource']['parent']
+            parent_id = int(parent['id']) if parent else None
+            while parent_id is not None and parent_id != ancestor_id and parent_id in parents:
+                parent_id = parents[parent_id]
+            if parent_id is None: continue
+            if parent_id != ancestor_id: unknown.add(parent_id)
+            kept.append(element)
+        return kept, sorted(unknown)
+
+    def _parent_id_or_none(self,resource_id):
+        # unreadable ancestor is treated as outside of subtree
+        import requests
+        try:
+            parent = self.get_resource(resource_id)['resource']['parent']
+        except requests.exceptions.HTTPError as e:
+            self.logger.warning('ancestor {resource_id} of search result is not readable: {e}'.format(resource_id=resource_id, e=e))
+            return None
+        return int(parent['id']) if parent else None
     
-    def search_resource_by_name(self,name,group_id=0,cls='')->list:
+    def search_resource_by_name(self,name,group_id=0,cls='',recursive=False)->list:
         """ 
-        Search by name with wildcards, not using api method /search. Returns list of dicts.
+        Search by name with wildcards * ? using api method /search. Returns list of dicts.
+        With recursive=True search in whole subtree of group_id.
         """
-        url=self.ngw_url+'/api/resource/?parent='+str(group_id)
-        request = requests.get(url, auth=self.ngw_creds)
-        request.raise_for_status()
-        response = request.json()
+        params = dict()
+        if '*' in name or '?' in name or '[' in name:
+            if '[' not in name:
+                # narrow result on server, exact match by fnmatch is checked below
+                params['display_name__ilike'] = name.replace('%', '\\%').replace('_', '\\_').replace('*', '%').replace('?', '_')
+        else:
+            params['display_name'] = name
+        response = self.search_resource(cls=cls if cls != '' else None,parent_id=group_id,recursive=recursive,**params)
         
         results=list()
 
         for element in response:
-            if cls=='' or (cls != '' and element['resource']['cls']==cls):
-                if name == element['resource']['display_name'] or fnmatch.fnmatch(element['resource']['display_name'], name):
-                    results.append(element)
+            if name == element['resource']['display_name'] or fnmatch.fnmatch(element['resource']['display_name'], name):
+                results.append(element)
         return results
         
     def get_resource_id_by_name(self,name,group_id=0)->int:
@@ -99,10 +544,7 @@ class Pyngw:
         """
         SEARCHNAME = name
 
-        url=self.ngw_url+'/api/resource/?parent='+str(group_id)
-        request = requests.get(url, auth=self.ngw_creds)
-        request.raise_for_status()
-        response = request.json()
+        response = self.search_resource(display_name=SEARCHNAME,parent_id=group_id)
 
         for element in response:
             if element['resource']['display_name']==SEARCHNAME:
@@ -110,10 +552,7 @@ class Pyngw:
         return None
 
     def get_styles_from_webmap_top(self,resource_id):
-        url=self.ngw_url+'/api/resource/'+str(resource_id)
-        request = requests.get(url, auth=self.ngw_creds)
-        request.raise_for_status()
-        response = request.json()
+        response = self.get_resource(resource_id)
 
         found_ids = list()
         for element in response['webmap']['root_item']['children']:
@@ -122,21 +561,18 @@ class Pyngw:
 
     def get_feature_count(self,resource_id):
         url=self.ngw_url+'/api/resource/'+str(resource_id)+'/feature_count'
-        request = requests.get(url, auth=self.ngw_creds)
+        request = self._request('GET', url)
         request.raise_for_status()
-        response = request.json()
+        response = self._decode(request)
         feature_count = response.get('total_count',None)
         if feature_count is not None:
             return int(feature_count)
         else:
             return None
 
-    def search_by_cls(self,group_id=0,cls='webmap'):
+    def search_by_cls(self,group_id=0,cls='webmap',recursive=False):
 
-        url=self.ngw_url+'/api/resource/?parent='+str(group_id)
-        request = requests.get(url, auth=self.ngw_creds)
-        request.raise_for_status()
-        response = request.json()
+        response = self.search_resource(cls=cls,parent_id=group_id,recursive=recursive)
 
         found_ids = list()
         for element in response:
@@ -160,8 +596,9 @@ class Pyngw:
         """ wrapper for PUT query, send payload"""
         assert payload is not None
 
-        response = requests.put(self.ngw_url+'/api/resource/'+str(resource_id), json=payload, auth=self.ngw_creds )
-        if skip_errors == False: assert response.ok
+        response = self._request('PUT', self.ngw_url+'/api/resource/'+str(resource_id), json=payload)
+        if skip_errors == False: response.raise_for_status()
+        if not response.ok: self.logger.warning('resource {resource_id} not updated: {status} {text}'.format(resource_id=resource_id, status=response.status_code, text=response.text))
 
     def delete_resource_by_id(self,id:int):
         """delete ngw resource
@@ -170,26 +607,98 @@ class Pyngw:
             id {[int, str]} -- [resource id]
         """
         url=self.ngw_url+'/api/resource/'+str(id)
-        request = requests.delete(url, auth=self.ngw_creds)
+        request = self._request('DELETE', url)
         request.raise_for_status()
         
-    def delete_features(self,resource_id:int,ids:list):
+    def delete_resources(self,ids,workers=8,parents=None)->BulkResult:
+        """[Delete many resources concurrently]
+
+        Arguments:
+            ids {iterable} -- [resource ids]
+
+        Keyword Arguments:
+            workers {int} -- [number of deletions running concurrently, should not exceed pool_maxsize] (default: {8})
+            parents {dict} -- [resource id: parent id. If given, children are deleted before their parents] (default: {None})
+
+        Returns:
+            [BulkResult] -- [succeeded and failed resource ids, seconds spent on each deletion]
+        """
+        ids = list(ids)
+        parents = parents or dict()
+        id_set = set(ids)
+
+        def depth(resource_id):
+            # number of ancestors which are deleted too
+            result = 0
+            parent_id = parents.get(resource_id)
+            while parent_id is not None and parent_id in id_set:
+                result += 1
+                parent_id = parents.get(parent_id)
+            return result
+
+        waves = dict()
+        for resource_id in ids: waves.setdefault(depth(resource_id), []).append(resource_id)
+
+        result = BulkResult()
+        for level in sorted(waves, reverse=True):
+            self._run_bulk(waves[level], lambda resource_id: self.delete_resource_by_id(resource_id), workers, result)
+        return result
+
+    def delete_subtree(self,resource_id,workers=8,keep_root=False)->BulkResult:
+        """[Delete resource and all its descendants, children before parents. Tree is listed with walk_tree]
+
+        Keyword Arguments:
+            workers {int} -- [number of listings and deletions running concurrently] (default: {8})
+            keep_root {bool} -- [delete only descendants of resource_id] (default: {False})
+        """
+        parents = {record.id: record.parent_id for record in self.walk_tree(resource_id, workers=workers)}
+        if not keep_root and int(resource_id) != 0:
+            parents[int(resource_id)] = None
+        return self.delete_resources(list(parents), workers=workers, parents=parents)
+
+    def _run_bulk(self,keys,function,workers,result):
+        # call function for each key in thread pool, record timings and errors in BulkResult
+        def run(key):
+            started = time.perf_counter()
+            try:
+                function(key)
+                result.succeeded.append(key)
+            except Exception as e:
+                self.logger.error('{key} failed: {e}'.format(key=key, e=e))
+                result.failed[key] = e
+            result.timings[key] = time.perf_counter() - started
+
+        with self._executor(workers) as executor:
+            for future in [executor.submit(run, key) for key in keys]: future.result()
+        return result
+
+    def delete_features(self,resource_id:int,ids:list,chunk_size=1000,workers=1):
         """
-        delete features from vector layer by list of features
+        delete features from vector layer by list of features.
+        Long lists are sent by chunks of chunk_size ids, workers chunks concurrently.
+        All chunks are tried, then first error is raised. Returns BulkResult with offsets of chunks
         """
         url=self.ngw_url+'/api/resource/'+str(resource_id)+'/feature/'
-        payload = {}
         if len(ids)<1: return False
-        
-        payload=[]
-        for id in ids:
-            payload.append({"id":int(id)})
-        request = requests.delete(url, data=json.dumps(payload), auth=self.ngw_creds)
-        request.raise_for_status()
 
-    def truncate_group(self,group_id):
+        def delete_chunk(offset):
+            request = self._request('DELETE', url, json=[{"id": int(id)} for id in ids[offset:offset+chunk_size]])
+            request.raise_for_status()
+
+        result = self._run_bulk(range(0, len(ids), chunk_size), delete_chunk, workers, BulkResult())
+        result.succeeded.sort()
+        self._raise_failed(result)
+        return result
+
+    def _raise_failed(self,result):
+        if not result.ok: raise result.failed[min(result.failed)]
+
+    def truncate_group(self,group_id,workers=8):
+        """ delete all children of group concurrently. All are tried, then first error is raised. Returns BulkResult """
         resources = self.get_childs_resources(group_id)
-        for resource in resources: self.delete_resource_by_id(resource['resource']['id'])
+        result = self.delete_resources([resource['resource']['id'] for resource in resources], workers=workers)
+        self._raise_failed(result)
+        return result
 
     def truncate_layer(self,layer_id):
         """[Delete all features in layer]
@@ -198,7 +707,8 @@ class Pyngw:
         # https://docs.nextgis.ru/docs_ngweb_dev/doc/developer/change.html#delete-all-features
 
         url=self.ngw_url+'/api/resource/'+str(layer_id)+'/feature/'
-        request = requests.delete(url, auth=self.ngw_creds)
+        request = self._request('DELETE', url)
+        request.raise_for_status()
 
     def create_resource_group(self, parent_id=0, display_name='', overwrite=None):
         """[Create new resource group.]
@@ -244,10 +754,10 @@ class Pyngw:
         payload['resource']['display_name'] = display_name
 
         url=self.ngw_url+'/api/resource/'
-        request = requests.post(url, json = payload, auth=self.ngw_creds)
+        request = self._request('POST', url, json = payload)
         request.raise_for_status()
 
-        response = request.json()
+        response = self._decode(request)
         group_id = response['id']
         return int(group_id)
 
@@ -281,7 +791,170 @@ class Pyngw:
                 return res['resource']['id']
         return None
 
-    def upload_vector_layer_tus(self,filepath,group_id, display_name=''):
+    def upload_file(self,filepath,progress=None,chunk_size=None,workers=None,resume=True)->dict:
+        """[Upload file to file_upload component. Returns dict for source or file_upload key in resource payload]
+
+        Files bigger than chunk_size are uploaded with tus.io protocol by chunks.
+        If upload is broken, url of upload is kept in upload_resume_dir, and next call with same file continues from last sent chunk.
+        If server has removed kept upload (404, 410 or 403), state is deleted and file is uploaded again.
+
+        Arguments:
+            filepath {str} -- [path to file]
+
+        Keyword Arguments:
+            progress {callable} -- [called after each chunk as progress(sent_bytes, total_bytes)] (default: {None})
+            chunk_size {int} -- [bytes in one chunk] (default: {upload_chunk_size from constructor})
+            workers {int} -- [number of parts uploaded concurrently, used only if ngw supports tus concatenation] (default: {upload_workers from constructor})
+            resume {bool} -- [continue previous broken upload of same file] (default: {True})
+        """
+        chunk_size = chunk_size or self.upload_chunk_size
+        workers = workers or self.upload_workers
+        size = os.path.getsize(filepath)
+
+        if size <= chunk_size:
+            with open(filepath, 'rb') as fd:
+                file_upload_result = self._request('PUT', self.ngw_url + '/api/component/file_upload/upload', data=fd)
+                file_upload_result.raise_for_status()
+            if progress is not None: progress(size, size)
+            return self._decode(file_upload_result)
+
+        endpoint = self.ngw_url + '/api/component/file_upload/'
+        stat = os.stat(filepath)
+        resume_key = hashlib.sha256('{url}|{path}|{size}|{mtime}|{chunk_size}|{workers}'.format(url=self.ngw_url,
+            path=os.path.abspath(filepath), size=size, mtime=stat.st_mtime_ns, chunk_size=chunk_size, workers=workers).encode('utf-8')).hexdigest()
+        resume_path = os.path.join(self.upload_resume_dir, resume_key+'.json')
+        state = None
+        if resume and os.path.isfile(resume_path):
+            try:
+                with open(resume_path) as fp:
+                    state = json.load(fp)
+            except ValueError:
+                state = None
+            # state of other file content or damaged state is not resumed
+            if state is None or state.get('length') != size:
+                self.logger.warning('upload state {path} does not match file, start new upload'.format(path=resume_path))
+                os.remove(resume_path)
+                state = None
+
+        def save_state(state):
+            os.makedirs(self.upload_resume_dir, exist_ok=True)
+            with open(resume_path, 'w') as fp:
+                json.dump(state, fp)
+
+        sent = dict()
+        progress_lock = threading.Lock()
+
+        def part_progress(part_index, offset):
+            with progress_lock:
+                sent[part_index] = offset
+                if progress is not None: progress(sum(sent.values()), size)
+
+        def new_state():
+            parts = [(0, size)]
+            if workers > 1 and 'concatenation' in self._tus_extensions(endpoint):
+                part_size = max(chunk_size, -(-size // workers))
+                parts = [(start, min(start + part_size, size)) for start in range(0, size, part_size)]
+            if len(parts) == 1:
+                state = dict(length=size, url=self._tus_create(endpoint, size, os.path.basename(filepath)), parts=[])
+            else:
+                state = dict(length=size, url=None, parts=[dict(start=start, end=end, url=self._tus_create(endpoint, end-start, os.path.basename(filepath), concat='partial'))
+                    for start, end in parts])
+            save_state(state)
+            return state
+
+        resumed = state is not None
+        if state is None: state = new_state()
+
+        while True:
+            try:
+                if len(state['parts']) == 0:
+                    self._tus_send(state['url'], filepath, 0, size, chunk_size, lambda offset: part_progress(0, offset))
+                    url = state['url']
+                else:
+                    with self._executor(workers) as executor:
+                        futures = [executor.submit(self._tus_send, part['url'], filepath, part['start'], part['end'], chunk_size,
+                            lambda offset, index=index: part_progress(index, offset)) for index, part in enumerate(state['parts'])]
+                        for future in futures: future.result()
+                    url = self._tus_create(endpoint, None, os.path.basename(filepath), concat='final;'+' '.join(part['url'] for part in state['parts']))
+                break
+            except _UploadExpired as e:
+                # server dropped resumed upload (expired or removed), state is useless
+                if os.path.isfile(resume_path): os.remove(resume_path)
+                if not resumed: raise e.error
+                self.logger.warning('resumed upload is gone on server: {e}, start new upload'.format(e=e.error))
+                resumed = False
+                sent.clear()
+                state = new_state()
+
+        file_upload_result = self._request('GET', url)
+        file_upload_result.raise_for_status()
+        if os.path.isfile(resume_path): os.remove(resume_path)
+        file_upload_meta = self._decode(file_upload_result)
+        self.logger.debug('file_upload_result = '+str(file_upload_meta))
+        return file_upload_meta
+
+    def _tus_extensions(self,endpoint)->list:
+        response = self._request('OPTIONS', endpoint, headers={'Tus-Resumable': '1.0.0'})
+        if not response.ok: return []
+        return [extension.strip() for extension in response.headers.get('Tus-Extension', '').split(',')]
+
+    def _tus_create(self,endpoint,length,name,concat=None)->str:
+        """ create tus upload, return its url """
+        headers = {'Tus-Resumable': '1.0.0',
+                   'Upload-Metadata': 'name '+base64.b64encode(name.encode('utf-8')).decode('ascii')}
+        if length is not None: headers['Upload-Length'] = str(length)
+        if concat is not None: headers['Upload-Concat'] = concat
+        response = self._request('POST', endpoint, headers=headers)
+        response.raise_for_status()
+        return urljoin(endpoint, response.headers['Location'])
+
+    def _tus_send(self,url,filepath,start,end,chunk_size,progress,retries=3):
+        """ send bytes start:end of file to tus upload, from offset stored on server.
+        Each chunk is repeated up to retries times with backoff of retry_policy """
+        import requests
+
+        def server_offset()->int:
+            response = self._request('HEAD', url, headers={'Tus-Resumable': '1.0.0'})
+            self._check_upload_exists(response)
+            response.raise_for_status()
+            if int(response.headers.get('Upload-Length', end - start)) != end - start:
+                raise _UploadExpired(ValueError('upload {url} has other length'.format(url=url)))
+            return int(response.headers['Upload-Offset'])
+
+        offset = server_offset()
+        progress(offset)
+        attempt = 0
+        with open(filepath, 'rb') as fd:
+            while offset < end - start:
+                fd.seek(start + offset)
+                chunk = fd.read(min(chunk_size, end - start - offset))
+                try:
+                    response = self._request('PATCH', url, data=chunk, headers={'Tus-Resumable': '1.0.0',
+                        'Upload-Offset': str(offset), 'Content-Type': 'application/offset+octet-stream'})
+                    self._check_upload_exists(response)
+                    response.raise_for_status()
+                    offset = int(response.headers['Upload-Offset'])
+                    attempt = 0
+                except requests.exceptions.RequestException as e:
+                    if attempt >= retries: raise
+                    delay = self.retry_policy.delay(attempt)
+                    self.logger.warning('upload chunk at offset {offset} failed: {e}, retry in {delay:.1f} s'.format(offset=offset, e=e, delay=delay))
+                    time.sleep(delay)
+                    attempt += 1
+                    offset = server_offset()
+                progress(offset)
+
+    @staticmethod
+    def _check_upload_exists(response):
+        # tus upload removed by server (expired, or of other user) can not be continued
+        if response.status_code in (403, 404, 410):
+            import requests
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                raise _UploadExpired(e)
+
+    def upload_vector_layer_tus(self,filepath,group_id, display_name='', progress=None):
         """[Create vector layer from file]
 
         Arguments:
@@ -290,33 +963,24 @@ class Pyngw:
 
         Keyword Arguments:
             display_name {str} -- [display name of new resource] (default: {''})
+            progress {callable} -- [see upload_file] (default: {None})
 
         Returns:
             [int] -- [id of new layer]
         """
         if display_name == '': display_name = self.generate_name()
-        url = self.ngw_url + '/api/component/file_upload/'
-        tus_client = TusClient(url)
-
-        metadata = dict(name=display_name)
-        uploader = tus_client.uploader(filepath, metadata=metadata)
-        uploader.upload()
-        furl = uploader.url
-        self.logger.debug('uploader_url='+furl)
-        file_upload_result = requests.get(furl , auth=self.ngw_creds )
-        file_upload_result.raise_for_status()
+        file_upload_result = self.upload_file(filepath, progress=progress)
 
-        self.logger.debug('file_upload_result = '+str(file_upload_result.json()))
         payload=dict(
             resource=dict(cls='vector_layer', parent=dict(id=group_id), display_name=display_name),
 
-        vector_layer=dict(  source=file_upload_result.json(),
+        vector_layer=dict(  source=file_upload_result,
                             srs=dict(id=3857))
         )
 
-        vector_layer = requests.post(self.ngw_url+'/api/resource/', json=payload, auth=self.ngw_creds )
+        vector_layer = self._request('POST', self.ngw_url+'/api/resource/', json=payload)
         vector_layer.raise_for_status()
-        return vector_layer.json()['id']
+        return self._decode(vector_layer)['id']
 
     def upload_vector_layer(self,filepath,group_id, display_name='',
             cast_is_multi=True,
@@ -325,7 +989,8 @@ class Pyngw:
             fix_errors='LOSSY',
             skip_errors=True,
             fid_source='AUTO',
-            fid_field=None):
+            fid_field=None,
+            progress=None):
         """[Create vector layer from file]
 
         Arguments:
@@ -335,6 +1000,7 @@ class Pyngw:
 
         Keyword Arguments:
             display_name {str} -- [display name of new resource] (default: {''})
+            progress {callable} -- [see upload_file] (default: {None})
 
         Returns:
             [int] -- [id of new layer]
@@ -342,15 +1008,32 @@ class Pyngw:
 
         if display_name == '': display_name = self.generate_name()
 
-        with open(filepath, 'rb') as fd:
-            file_upload_result = requests.put(self.ngw_url + '/api/component/file_upload/upload', data=fd)
-            file_upload_result.raise_for_status()
+        file_upload_result = self.upload_file(filepath, progress=progress)
+
+        return self._create_vector_layer_from_source(group_id, display_name, file_upload_result,
+            cast_is_multi=cast_is_multi,
+            cast_has_z=cast_has_z,
+            skip_other_geometry_types=skip_other_geometry_types,
+            fix_errors=fix_errors,
+            skip_errors=skip_errors,
+            fid_source=fid_source,
+            fid_field=fid_field)
 
+    def _create_vector_layer_from_source(self,group_id,display_name,source,
+            cast_is_multi=True,
+            cast_has_z=False,
+            skip_other_geometry_types=False,
+            fix_errors='LOSSY',
+            skip_errors=True,
+            fid_source='AUTO',
+            fid_field=None,
+            cast_geometry_type=None):
+        """ create vector layer from file uploaded to file_upload component """
         payload=dict(
             resource=dict(cls='vector_layer', parent=dict(id=group_id), display_name=display_name, 
             ),
 
-        vector_layer=dict(  source=file_upload_result.json(),
+        vector_layer=dict(  source=source,
                             srs=dict(id=3857),
                                  
      cast_is_multi= cast_is_multi,
@@ -362,12 +1045,82 @@ class Pyngw:
      )
         )
         if fid_field is not None: payload['vector_layer']['fid_field']=fid_field
+        if cast_geometry_type is not None: payload['vector_layer']['cast_geometry_type']=cast_geometry_type
 
-        layer_create_response = requests.post(self.ngw_url+'/api/resource/', json=payload, auth=self.ngw_creds )
+        layer_create_response = self._request('POST', self.ngw_url+'/api/resource/', json=payload)
         layer_create_response.raise_for_status()
-        if layer_create_response.json().get('exception'):
-            raise ValueError(layer_create_response.json().get('exception') +': '+ layer_create_response.json().get('message', ''))
-        return layer_create_response.json()['id']
+        layer_create_result = self._decode(layer_create_response)
+        if layer_create_result.get('exception'):
+            raise ValueError(layer_create_result.get('exception') +': '+ layer_create_result.get('message', ''))
+        return layer_create_result['id']
+
+    def upload_features_as_layer(self,group_id,features,geometry_type,fields,display_name='',zipped=False,
+            skip_other_geometry_types=False,
+            fix_errors='LOSSY',
+            skip_errors=True,
+            buffer_size=1024*1024):
+        """[Create vector layer from features generated in python, without temporary file.
+        Features are encoded to GeoJSON by one and streamed to file_upload component with chunked transfer encoding,
+        so memory usage does not depend on number of features]
+
+        Arguments:
+            group_id {int} -- [id of resource group, where layer will created]
+            features {iterable} -- [GeoJSON features as dicts: {"geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": {...}}, in EPSG:4326]
+            geometry_type {str} -- [geometry type of layer, for example 'POINT', 'MULTILINESTRING', 'POLYGONZ']
+            fields {list} -- [list of dicts with keyname, as in create_vector_layer. Only these properties are uploaded, missing are null]
+
+        Keyword Arguments:
+            display_name {str} -- [display name of new resource] (default: {''})
+            zipped {bool} -- [compress GeoJSON to zip on the fly, for slow connections] (default: {False})
+            buffer_size {int} -- [bytes collected before sending to network] (default: {1 MiB})
+            next: see upload_vector_layer
+
+        Returns:
+            [int] -- [id of new layer]
+        """
+        if display_name == '': display_name = self.generate_name()
+        geometry_type = geometry_type.upper()
+        assert 'LINESTRING' in geometry_type or 'POINT' in geometry_type or 'POLYGON' in geometry_type
+        keynames = [field['keyname'] for field in fields]
+
+        def encode():
+            yield b'{"type": "FeatureCollection", "features": [\n'
+            separator = b''
+            for feature in features:
+                properties = feature.get('properties') or {}
+                feature = {"type": "Feature",
+                           "geometry": feature['geometry'],
+                           "properties": {keyname: properties.get(keyname) for keyname in keynames}}
+                yield separator + self.codec.dumps(feature)
+                separator = b',\n'
+            yield b'\n]}\n'
+
+        def stream():
+            sink = _StreamSink()
+            if zipped:
+                import zipfile
+                archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+                target = archive.open('layer.geojson', 'w', force_zip64=True)
+            else:
+                target = sink
+            for data in encode():
+                target.write(data)
+                if sink.size >= buffer_size: yield sink.take()
+            if zipped:
+                target.close()
+                archive.close()
+            yield sink.take()
+
+        file_upload_result = self._request('PUT', self.ngw_url + '/api/component/file_upload/upload', data=stream())
+        file_upload_result.raise_for_status()
+
+        return self._create_vector_layer_from_source(group_id, display_name, self._decode(file_upload_result),
+            cast_is_multi=geometry_type.startswith('MULTI'),
+            cast_has_z=geometry_type.endswith('Z'),
+            cast_geometry_type=geometry_type.replace('MULTI', '').rstrip('Z').strip(),
+            skip_other_geometry_types=skip_other_geometry_types,
+            fix_errors=fix_errors,
+            skip_errors=skip_errors)
 
     def create_postgis_connection(self,group_id=0, display_name='',hostname='localhost',port=54321,database='gis',username='',password=''):
         """[Create PostGIS connection in ngw]
@@ -404,10 +1157,10 @@ class Pyngw:
         }
         }
 
-        response = requests.post(self.ngw_url+'/api/resource/', json=payload, auth=self.ngw_creds)
+        response = self._request('POST', self.ngw_url+'/api/resource/', json=payload)
         response.raise_for_status()
         assert response.status_code == 201
-        postgis_connection_id = response.json()['id']
+        postgis_connection_id = self._decode(response)['id']
         return postgis_connection_id
 
     def create_postgis_layer(self,connection,table='',group_id=0, display_name=''):
@@ -447,9 +1200,9 @@ class Pyngw:
         }
         }
 
-        response = requests.post(self.ngw_url+'/api/resource/', json=payload, auth=self.ngw_creds)
+        response = self._request('POST', self.ngw_url+'/api/resource/', json=payload)
         response.raise_for_status()
-        postgis_layer = response.json()['id']
+        postgis_layer = self._decode(response)['id']
         return postgis_layer
 
     def create_wms_connection(self,group_id=0, display_name='',url='',username=None,password=None):
@@ -485,9 +1238,9 @@ class Pyngw:
         }
         #"https://mrdata.usgs.gov/services/kb"
 
-        response = requests.post(self.ngw_url+'/api/resource/', json=payload, auth=self.ngw_creds)
+        response = self._request('POST', self.ngw_url+'/api/resource/', json=payload)
         response.raise_for_status()
-        wms_connection_id = response.json()['id']
+        wms_connection_id = self._decode(response)['id']
         return wms_connection_id
 
     def create_wms_layer(self,connection,layer='',group_id=0, display_name=''):
@@ -512,12 +1265,12 @@ class Pyngw:
                 },
             }
         }
-        response = requests.post(self.ngw_url+'/api/resource/', json=payload, auth=self.ngw_creds)
+        response = self._request('POST', self.ngw_url+'/api/resource/', json=payload)
         response.raise_for_status()
-        wms_layer = response.json()['id']
+        wms_layer = self._decode(response)['id']
         return wms_layer
 
-    def upload_raster_layer(self, filepath, group_id, display_name = ''):
+    def upload_raster_layer(self, filepath, group_id, display_name = '', progress=None):
         """[Create raster layer from file. Raster style is not created]
 
         Arguments:
@@ -526,14 +1279,13 @@ class Pyngw:
 
         Keyword Arguments:
             display_name {str} -- [description] (default: {''})
+            progress {callable} -- [see upload_file] (default: {None})
 
         Returns:
             [id] -- [resource id of new layer]
         """
         if display_name == '': display_name = self.generate_name()
-        with open(filepath, 'rb') as fd:
-            file_upload_result = requests.put(self.ngw_url + '/api/component/file_upload/upload', data=fd)
-            file_upload_result.raise_for_status()
+        file_upload_result = self.upload_file(filepath, progress=progress)
 
         payload = {
         "resource": {
@@ -542,14 +1294,14 @@ class Pyngw:
             "parent": {"id": group_id}
         },
         "raster_layer": {
-            "source": file_upload_result.json(),
+            "source": file_upload_result,
             "srs": {"id": 3857}
         }
         }
 
-        raster_layer = requests.post(self.ngw_url+'/api/resource/', json=payload, auth=self.ngw_creds)
+        raster_layer = self._request('POST', self.ngw_url+'/api/resource/', json=payload)
         raster_layer.raise_for_status()
-        return raster_layer.json()['id']
+        return self._decode(raster_layer)['id']
 
     def upload_geojson(self,filepath,group_id):
         """[alias for backward compability, please use upload_vector_layer instead]
@@ -569,41 +1321,37 @@ class Pyngw:
         payload=dict(
             resource=dict(cls='raster_style', parent=dict(id=layer_id), display_name=display_name),
         )
-        response = requests.post(self.ngw_url+'/api/resource/', json=payload, auth=self.ngw_creds )
+        response = self._request('POST', self.ngw_url+'/api/resource/', json=payload)
         response.raise_for_status()
-        return response.json()['id']
+        return self._decode(response)['id']
 
-    def upload_qgis_style(self,filepath,layer_id,display_name='', skip_errors = False):
+    def upload_qgis_style(self,filepath,layer_id,display_name='', skip_errors = False, progress=None):
         if display_name == '':
             display_name=os.path.splitext(filepath)[0]
 
         self.logger.debug("upload style "+ filepath + ' to '+ self.ngw_url+'/api/resource/'+str(layer_id) + '    '+display_name)
-        with open(filepath, 'rb') as fd:
-            file_upload_result = requests.put(self.ngw_url + '/api/component/file_upload/upload', data=fd)
-            file_upload_result.raise_for_status()
+        file_upload_result = self.upload_file(filepath, progress=progress)
         payload=dict(
             resource=dict(cls='qgis_vector_style', parent=dict(id=layer_id), display_name=display_name),
 
-        qgis_vector_style=dict(file_upload=file_upload_result.json())
+        qgis_vector_style=dict(file_upload=file_upload_result)
         )
-        response = requests.post(self.ngw_url+'/api/resource/', json=payload, auth=self.ngw_creds )
+        response = self._request('POST', self.ngw_url+'/api/resource/', json=payload)
         response.raise_for_status()
-        return response.json()['id']
+        return self._decode(response)['id']
 
-    def replace_qgis_style(self,filepath,style_id):
+    def replace_qgis_style(self,filepath,style_id,progress=None):
 
         self.logger.debug("replace style "+ filepath + ' to '+ self.ngw_url+'/api/resource/'+str(style_id) )
 
-        with open(filepath, 'rb') as fd:
-            file_upload_result = requests.put(self.ngw_url + '/api/component/file_upload/upload', data=fd)
-            file_upload_result.raise_for_status()
+        file_upload_result = self.upload_file(filepath, progress=progress)
         payload=dict(
-                        qgis_vector_style=dict(id=style_id,file_upload=file_upload_result.json())
+                        qgis_vector_style=dict(id=style_id,file_upload=file_upload_result)
         )
-        response = requests.put(self.ngw_url+'/api/resource/'+str(style_id), json=payload, auth=self.ngw_creds )
+        response = self._request('PUT', self.ngw_url+'/api/resource/'+str(style_id), json=payload)
         response.raise_for_status()
 
-        return response.json()
+        return self._decode(response)
 
     def create_wms(self,group_id,layers,display_name='autogenerated_wms_service'):
         """[summary]
@@ -633,9 +1381,9 @@ class Pyngw:
         }
         }
 
-        response = requests.post(self.ngw_url+'/api/resource/', json=payload, auth=self.ngw_creds )
+        response = self._request('POST', self.ngw_url+'/api/resource/', json=payload)
         response.raise_for_status()
-        return response.json()['id']
+        return self._decode(response)['id']
 
     def create_wms_from_webmap(self,webmap_id, display_name='autogenerated_wfs_service'):
         wms_layers = list()
@@ -665,16 +1413,16 @@ class Pyngw:
         }
         }
 
-        response = requests.post(self.ngw_url+'/api/resource/', json=payload, auth=self.ngw_creds )
+        response = self._request('POST', self.ngw_url+'/api/resource/', json=payload)
         response.raise_for_status()
-        return response.json()['id']
+        return self._decode(response)['id']
 
     def create_vector_feature(self,layer_id,geom,fields)->int:
         payload = {"geom": geom, "fields": fields}
-        response = requests.post(self.ngw_url+'/api/resource/'+str(layer_id)+'/feature/', json=payload, auth=self.ngw_creds )
+        response = self._request('POST', self.ngw_url+'/api/resource/'+str(layer_id)+'/feature/', json=payload)
         response.raise_for_status()
 
-        return response.json()['id']
+        return self._decode(response)['id']
         '''
 curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"new"}, "vector_layer":{"geometry_type":"LINESTRING","srs":{"id":3857}, "fields":[{"keyname":"fieldname1","datatype":"STRING","display_name":"fld1"}]}   }' -u administrator:demodemo -X POST https://sandbox.nextgis.com/api/resource/
 
@@ -682,6 +1430,149 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
 
    '''
 
+    def create_vector_features(self,layer_id,features,chunk_size=500,workers=4)->BulkResult:
+        """[Create many features in vector layer, by chunks with PATCH query to feature collection]
+
+        Arguments:
+            layer_id {int} -- [id of vector layer]
+            features {iterable} -- [dicts as in create_vector_feature: {"geom": wkt, "fields": {...}}]
+
+        Keyword Arguments:
+            chunk_size {int} -- [number of features in one query] (default: {500})
+            workers {int} -- [number of chunks sent concurrently, should not exceed pool_maxsize] (default: {4})
+
+        Returns:
+            [BulkResult] -- [ids of new features in input order. Failed chunks are in failed dict by offset of chunk, their ids are None]
+        """
+        features = ({"geom": feature["geom"], "fields": feature["fields"]} for feature in features)
+        return self._patch_features(layer_id, features, chunk_size, workers)
+
+    def _patch_features(self,layer_id,features,chunk_size,workers)->BulkResult:
+        # PATCH to feature collection creates features without id and updates features with id
+        assert chunk_size > 0
+        assert workers > 0
+        url = self.ngw_url+'/api/resource/'+str(layer_id)+'/feature/'
+        result = BulkResult()
+
+        def send_chunk(offset, chunk):
+            started = time.perf_counter()
+            try:
+                response = self._request('PATCH', url, json=chunk)
+                response.raise_for_status()
+                ids = [element['id'] for element in self._decode(response)]
+                # ids are matched to features by position, other number of ids can not be matched
+                if len(ids) != len(chunk):
+                    raise ValueError('server returned {count} ids for {size} features'.format(count=len(ids), size=len(chunk)))
+                for index, feature_id in enumerate(ids):
+                    result.ids[offset+index] = feature_id
+                result.succeeded.append(offset)
+            except Exception as e:
+                self.logger.error('features chunk at offset {offset} not created: {e}'.format(offset=offset, e=e))
+                result.failed[offset] = e
+            result.timings[offset] = time.perf_counter() - started
+
+        iterator = iter(features)
+        offset = 0
+        pending = set()
+        with self._executor(workers) as executor:
+            while True:
+                chunk = list(islice(iterator, chunk_size))
+                if len(chunk) == 0: break
+                result.ids.extend([None]*len(chunk))
+                pending.add(executor.submit(send_chunk, offset, chunk))
+                offset += len(chunk)
+                # keep only few chunks in memory
+                if len(pending) >= workers*2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        result.succeeded.sort()
+        return result
+
+    def sync_vector_layer(self,layer_id,features,key_field,chunk_size=500,workers=4,precision=None,dry_run=False)->dict:
+        """[Make vector layer equal to local features, sending only changed features]
+
+        Remote features are matched with local ones by value of key_field, and compared by hash of geometry and fields.
+        New features are created, changed features are updated by PATCH to feature collection, features missing in local data are deleted.
+        Unchanged features are not sent, layer id, styles and webmaps are not changed.
+        Only fields present in local features are compared and sent, other fields of layer are kept.
+
+        Arguments:
+            layer_id {int} -- [id of vector layer]
+            features {iterable} -- [dicts as in create_vector_feature: {"geom": wkt, "fields": {...}}, all with same fields. Dates are ISO strings or date, time, datetime objects]
+            key_field {str} -- [keyname of field with unique value]
+
+        Keyword Arguments:
+            chunk_size {int} -- [number of features in one query] (default: {500})
+            workers {int} -- [number of chunks sent concurrently] (default: {4})
+            precision {int} -- [round coordinates to decimal digits before compare, so format of numbers does not matter] (default: {None})
+            dry_run {bool} -- [only count changes, send nothing] (default: {False})
+
+        Returns:
+            [dict] -- [number of inserted, updated, deleted and unchanged features]
+        """
+        iterator = iter(features)
+        first = next(iterator, None)
+        local = [first] if first is not None else []
+        names = sorted(first['fields']) if first is not None else [key_field]
+        assert key_field in names, 'key_field {key_field} is not in fields of features'.format(key_field=key_field)
+
+        # index of remote layer keeps only id and hash of every feature
+        remote = dict()
+        # dates are compared and sent as ISO strings, without dt_format ngw returns them as dicts
+        params = 'fields={fields}&extensions=&dt_format=iso'.format(fields=','.join(names))
+        for feature in self.iter_features(layer_id, page_size=1000, params=params, prefetch=True):
+            key = feature['fields'].get(key_field)
+            if key in remote: raise ValueError('value {key} of key_field {key_field} is not unique in layer {layer_id}'.format(key=key, key_field=key_field, layer_id=layer_id))
+            remote[key] = (feature['id'], self._feature_hash(feature.get('geom'), feature['fields'], names, precision))
+
+        stats = dict(inserted=0, updated=0, deleted=0, unchanged=0)
+        seen = set()
+
+        def changes():
+            for feature in chain(local, iterator):
+                feature = dict(feature, fields=self._iso_fields(feature['fields']))
+                key = feature['fields'][key_field]
+                if key in seen: raise ValueError('value {key} of key_field {key_field} is not unique in local features'.format(key=key, key_field=key_field))
+                seen.add(key)
+                if key not in remote:
+                    stats['inserted'] += 1
+                    yield {"geom": feature["geom"], "fields": feature["fields"]}
+                    continue
+                feature_id, digest = remote[key]
+                if digest == self._feature_hash(feature['geom'], feature['fields'], names, precision):
+                    stats['unchanged'] += 1
+                    continue
+                stats['updated'] += 1
+                yield {"id": feature_id, "geom": feature["geom"], "fields": feature["fields"]}
+
+        if dry_run:
+            for change in changes(): pass
+        else:
+            self._raise_failed(self._patch_features(layer_id, changes(), chunk_size, workers))
+
+        deleted_ids = [feature_id for key, (feature_id, digest) in remote.items() if key not in seen]
+        stats['deleted'] = len(deleted_ids)
+        if deleted_ids and not dry_run: self.delete_features(layer_id, deleted_ids, chunk_size=chunk_size, workers=workers)
+        self.logger.info('sync of layer {layer_id}: {stats}'.format(layer_id=layer_id, stats=stats))
+        return stats
+
+    @staticmethod
+    def _iso_fields(fields)->dict:
+        # date, time and datetime values as ISO strings, as ngw returns them with dt_format=iso
+        if not any(isinstance(value, (datetime.date, datetime.time)) for value in fields.values()): return fields
+        return dict((name, value.isoformat() if isinstance(value, (datetime.date, datetime.time)) else value) for name, value in fields.items())
+
+    @staticmethod
+    def _feature_hash(geom,fields,names,precision)->bytes:
+        # wkt is normalized, so "POINT(1 2)" and "POINT (1.0 2.0)" are equal
+        if geom is not None:
+            def number(match):
+                value = float(match.group(0))
+                return repr(round(value, precision) if precision is not None else value)
+            geom = re.sub(r'\s+', ' ', re.sub(r'[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?', number, geom.upper()))
+            geom = re.sub(r' ?([(),]) ?', r'\1', geom.strip())
+        content = json.dumps([geom, [fields.get(name) for name in names]], sort_keys=True, default=str)
+        return hashlib.sha256(content.encode('utf-8')).digest()
+
     def create_vector_layer(self,group_id,display_name,geometry_type,fields):
         if display_name == '': display_name = 'layer ' + self.generate_name()
         assert 'LINESTRING' in geometry_type or 'POINT' in geometry_type or 'POLYGON' in geometry_type
@@ -703,13 +1594,14 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
             "fields":fields,
         }
         }
-        response = requests.post(self.ngw_url+'/api/resource/', json=payload, auth=self.ngw_creds )
+        response = self._request('POST', self.ngw_url+'/api/resource/', json=payload)
         response.raise_for_status()
 
-        return response.json()['id']
+        return self._decode(response)['id']
 
-    def replace_vector_layer(self,old_display_name,group_id,filepath) -> int:
+    def replace_vector_layer(self,old_display_name,group_id,filepath,key_field=None) -> int:
         #upload new layer, move vector styles from old to new layer, delete old layer, rename new layer to old
+        #with key_field: features of file are synced into old layer by sync_vector_layer, only changed features are sent
         
         layer_id = None
         resources = self.get_childs_resources(group_id)
@@ -717,6 +1609,10 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
             if resource['resource']['display_name'] == old_display_name and resource['resource']['cls'] == 'vector_layer':
                 layer_id = resource['resource']['id']
         assert layer_id is not None
+
+        if key_field is not None:
+            self.sync_vector_layer(layer_id, self._read_ogr_features(filepath, layer_id), key_field)
+            return layer_id
         
         timestamp = str(time.time())
         old_layer_data = self.get_resource(layer_id)
@@ -731,35 +1627,104 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
         self.update_resource_payload(new_layer_id,payload=payload,skip_errors=True)
         return new_layer_id
 
-    def get_layers4webmap(self, group_id,namesource='',layer_adapter='tile'):
-        """
-        Return list with layers for create_webmap
+    def _read_ogr_features(self,filepath,layer_id):
+        # features of first layer of file as dicts for sync_vector_layer, in srs of ngw layer, with fields of ngw layer
+        try:
+            from osgeo import ogr, osr
+        except ImportError as e:
+            raise ModuleNotFoundError('This method require Python GDAL bindings') from e
+        ogr.UseExceptions()
+        resource = self.get_resource(layer_id)
+        keynames = [field['keyname'] for field in resource['feature_layer']['fields']]
+        target_srs = osr.SpatialReference()
+        target_srs.ImportFromEPSG(resource['vector_layer']['srs']['id'])
+        target_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+        ds = ogr.Open(filepath)
+        layer = ds.GetLayer()
+        source_srs = layer.GetSpatialRef()
+        transformation = None
+        if source_srs is not None:
+            source_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+            transformation = osr.CoordinateTransformation(source_srs, target_srs)
+        definition = layer.GetLayerDefn()
+        types = dict((definition.GetFieldDefn(i).GetName(), definition.GetFieldDefn(i).GetType()) for i in range(definition.GetFieldCount()))
+        names = [name for name in types if name in keynames]
+        date_types = (ogr.OFTDate, ogr.OFTTime, ogr.OFTDateTime)
+
+        def value(feature, name):
+            # GetField returns dates as '2020/01/02', ngw uses ISO
+            if types[name] not in date_types or not feature.IsFieldSetAndNotNull(name): return feature.GetField(name)
+            year, month, day, hour, minute, second, tz = feature.GetFieldAsDateTime(name)
+            date = '{year:04d}-{month:02d}-{day:02d}'.format(year=year, month=month, day=day)
+            time = '{hour:02d}:{minute:02d}:{second:02d}'.format(hour=hour, minute=minute, second=int(second))
+            if types[name] == ogr.OFTDate: return date
+            if types[name] == ogr.OFTTime: return time
+            return date + 'T' + time
+
+        for feature in layer:
+            geometry = feature.GetGeometryRef()
+            if geometry is not None and transformation is not None: geometry.Transform(transformation)
+            yield {'geom': geometry.ExportToWkt() if geometry is not None else None,
+                   'fields': {name: value(feature, name) for name in names}}
+        ds = None
+
+    def get_layers4webmap(self, group_id,namesource='',layer_adapter='tile',nested=False,workers=8):
+        """[Return list with layers for create_webmap: vector layers of group which have qgis style]
+
+        Resources of whole subtree are found by one recursive search query, instead of listing of every layer.
+        If ngw does not support recursive search, tree is listed with walk_tree, listings are queried concurrently.
+
+        Keyword Arguments:
+            namesource {str} -- ['children' takes names of webmap layers from styles, else from layers] (default: {''})
+            layer_adapter {str} -- [adapter of webmap layers] (default: {'tile'})
+            nested {bool} -- [subgroups are added as webmap group items with their layers, groups without layers are skipped] (default: {False})
+            workers {int} -- [number of concurrent listings when recursive search is not supported] (default: {8})
         """
-        response = self.get_childs_resources(group_id)
-        webmap_children_lines = list()
-        for layer in response:
-            #call childrens second time for search vector_style
-            if layer['resource']['cls'] != 'vector_layer': continue
-            children_grand = self.get_childs_resources(layer['resource']['id'])
-            layer_style_id = None
-            children_name = None
-            for subelement in children_grand:
-                if subelement['resource']['cls'] != 'qgis_vector_style': continue
-                layer_style_id = subelement['resource']['id']
-                children_name = subelement['resource']['display_name']
-            if layer_style_id is None: continue
-            element=dict()
-            element['layer_adapter'] = layer_adapter
-            element['display_name']=layer['resource']['display_name']
-            if namesource == 'children': element['display_name'] = children_name
-            element['layer_style_id']=layer_style_id
-            element['layer_enabled']=True
-            element['item_type']='layer'
-            webmap_children_lines.append(element)
-        return webmap_children_lines
-
-    def create_webmap_from_group(self,group_id,display_name='', layer_adapter = 'tile'):
-        childrens = self.get_layers4webmap(group_id, layer_adapter = layer_adapter)
+        group_id = int(group_id)
+        import requests
+        try:
+            records = [ResourceRecord.from_dict(resource) for resource in self.search_resource(parent_id=group_id, recursive=True)]
+        except requests.exceptions.HTTPError as e:
+            self.logger.debug('recursive search failed: {e}, list tree'.format(e=e))
+            records = list(self.walk_tree(group_id, max_depth=None if nested else 2, workers=workers))
+        return self._webmap_items(records, group_id, namesource, layer_adapter, nested)
+
+    @staticmethod
+    def _webmap_items(records, group_id, namesource, layer_adapter, nested)->list:
+        # webmap items of group from records with id, cls, parent_id, display_name of its subtree
+        children = dict()
+        for record in records:
+            children.setdefault(record.parent_id, []).append(record)
+
+        def items(parent_id):
+            webmap_children_lines = list()
+            for resource in children.get(parent_id, []):
+                if resource.cls == 'resource_group' and nested:
+                    group_items = items(resource.id)
+                    if len(group_items) == 0: continue
+                    webmap_children_lines.append({'item_type': 'group', 'display_name': resource.display_name,
+                        'group_expanded': False, 'children': group_items})
+                    continue
+                if resource.cls != 'vector_layer': continue
+                # last style of layer is used
+                styles = [child for child in children.get(resource.id, []) if child.cls == 'qgis_vector_style']
+                if len(styles) == 0: continue
+                element=dict()
+                element['layer_adapter'] = layer_adapter
+                element['display_name']=resource.display_name
+                if namesource == 'children': element['display_name'] = styles[-1].display_name
+                element['layer_style_id']=styles[-1].id
+                element['layer_enabled']=True
+                element['item_type']='layer'
+                webmap_children_lines.append(element)
+            return webmap_children_lines
+
+        return items(group_id)
+
+    def create_webmap_from_group(self,group_id,display_name='', layer_adapter = 'tile', nested=False):
+        """ create webmap of vector layers with styles in group, see get_layers4webmap """
+        childrens = self.get_layers4webmap(group_id, layer_adapter = layer_adapter, nested=nested)
         return self.create_webmap(group_id,childrens,display_name)
 
     def create_webmap(self,group_id,childrens,display_name=''):
@@ -795,9 +1760,9 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
             }
 
 
-        response = requests.post(self.ngw_url+'/api/resource/', json=payload, auth=self.ngw_creds )
+        response = self._request('POST', self.ngw_url+'/api/resource/', json=payload)
         response.raise_for_status()
-        return response.json()['id']
+        return self._decode(response)['id']
 
     def download_vector_layer(self,path,layer_id,format='GeoJSON',srs=4326,zipped=False, intersects='',fid=None):
         """Download vector layer
@@ -811,7 +1776,246 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
             format {str} -- [description] (default: {'geojson'})
             srs {int} -- [description] (default: {4326})
             zipped {bool} -- [description] (default: {False})
+
+        With http_cache_dir export is revalidated by conditional query, unchanged layer is copied from cache.
         """
+        url, params = self._export_query(layer_id,format,srs,zipped,intersects,fid)
+        self.logger.debug('download vector layer '+url)
+        self._cached_get(url, params, path)
+
+    def iter_export(self,layer_id,format='GeoJSON',srs=4326,zipped=True,intersects='',fid=None,chunk_size=1024*1024):
+        """[Export vector layer as stream of bytes of file, without temp file]
+
+        Response is received with gzip content-encoding if server supports it, zip archive (zipped=True) is decompressed on the fly.
+        Memory usage is bounded by chunk_size.
+
+        Arguments:
+            layer_id {int} -- [id of vector layer]
+
+        Keyword Arguments:
+            format {str} -- [GeoJSON, GPKG or CSV] (default: {'GeoJSON'})
+            srs {int} -- [EPSG code of output coordinates] (default: {4326})
+            zipped {bool} -- [ask ngw to compress export into zip archive, it is unzipped while received] (default: {True})
+            intersects {str} -- [wkt of polygon in EPSG:4326, export only features which intersect it] (default: {''})
+            fid {str} -- [name of field for feature id in output] (default: {None})
+            chunk_size {int} -- [bytes read from network at once] (default: {1 MiB})
+
+        Returns:
+            [generator] -- [bytes chunks of exported file]
+        """
+        from .stream import iter_unzip
+        response = self._export_response(layer_id,format,srs,zipped,intersects,fid)
+        try:
+            chunks = response.iter_content(chunk_size=chunk_size)
+            if not zipped:
+                yield from chunks
+                return
+            # archive can contain auxiliary files, layer file is selected by extension
+            extension = {'GeoJSON': '.geojson', 'GPKG': '.gpkg', 'CSV': '.csv'}[format]
+            selected = None
+            for name, chunk in iter_unzip(chunks):
+                if selected is None and name.lower().endswith(extension): selected = name
+                if name == selected and chunk: yield chunk
+            if selected is None: raise ValueError('export of layer {layer_id} has no {extension} file'.format(layer_id=layer_id, extension=extension))
+        finally:
+            response.close()
+
+    def export_vector_layer(self,fileobj,layer_id,format='GeoJSON',srs=4326,zipped=True,intersects='',fid=None)->int:
+        """[Export vector layer to any writable file object: socket, pipe, stream of cloud storage]
+
+        Arguments are same as in iter_export.
+
+        Returns:
+            [int] -- [number of written bytes]
+        """
+        written = 0
+        for chunk in self.iter_export(layer_id,format=format,srs=srs,zipped=zipped,intersects=intersects,fid=fid):
+            fileobj.write(chunk)
+            written += len(chunk)
+        return written
+
+    def iter_export_features(self,layer_id,srs=4326,zipped=True,intersects='',fid=None):
+        """[Export vector layer as GeoJSON and yield features while export is received]
+
+        Features are parsed by incremental parser, so memory usage is bounded by largest feature, not by layer size.
+        Arguments are same as in iter_export.
+
+        Returns:
+            [generator] -- [GeoJSON feature dicts]
+        """
+        from .stream import iter_geojson_features
+        return iter_geojson_features(self.iter_export(layer_id,format='GeoJSON',srs=srs,zipped=zipped,intersects=intersects,fid=fid))
+
+    def export_vector_layer_tiled(self,path,layer_id,format='GeoJSON',tile_features=50000,workers=4,retries=3,
+            max_depth=8,fid='ngw_id',srs=4326,progress=None)->dict:
+        """[Export large vector layer by tiles in parallel, merge tiles into one file]
+
+        Layer extent is split by quadtree: tile is split into 4 while it has more than tile_features features,
+        count is probed by feature query with intersects filter and limit. Tiles are exported concurrently with
+        intersects filter, failed tile is repeated alone. Features crossing tile borders are written once, by fid.
+        Number of written features is checked against feature count of layer, ValueError is raised if they differ.
+
+        Arguments:
+            path {str} -- [path of output file]
+            layer_id {int} -- [id of vector layer]
+
+        Keyword Arguments:
+            format {str} -- [GeoJSON or GPKG. GPKG is converted from merged GeoJSON by GDAL] (default: {'GeoJSON'})
+            tile_features {int} -- [max number of features in one tile export] (default: {50000})
+            workers {int} -- [number of tiles probed and exported concurrently] (default: {4})
+            retries {int} -- [repeats of failed tile export] (default: {3})
+            max_depth {int} -- [max number of quadtree splits, tiles are not split deeper] (default: {8})
+            fid {str} -- [name of field for feature id in output, used for deduplication] (default: {'ngw_id'})
+            srs {int} -- [EPSG code of GPKG output. Tiles are exported in EPSG:4326, GeoJSON output is always EPSG:4326] (default: {4326})
+            progress {callable} -- [called after each tile as progress(done, total)] (default: {None})
+
+        Returns:
+            [dict] -- [number of tiles, written features and skipped duplicates]
+        """
+        from .stream import iter_geojson_features
+        import tempfile
+        assert format in ('GeoJSON','GPKG')
+        assert format == 'GPKG' or srs == 4326, 'GeoJSON output is always in EPSG:4326'
+        assert tile_features > 0 and workers > 0
+        if format == 'GPKG':
+            try:
+                from osgeo import gdal
+            except ImportError as e:
+                raise ModuleNotFoundError('GPKG output require Python GDAL bindings') from e
+
+        feature_count = self.get_feature_count(layer_id)
+        extent = self.get_layer_extent(layer_id)
+        tiles = list()
+        if extent['minLon'] is not None:
+            # extent is padded, so features on its edges and layers of one point or line have area to intersect
+            epsilon = 1e-6
+            bounds = (max(extent['minLon'] - epsilon, -180.0), max(extent['minLat'] - epsilon, -90.0),
+                min(extent['maxLon'] + epsilon, 180.0), min(extent['maxLat'] + epsilon, 90.0))
+            tiles = self._split_extent(layer_id, bounds, tile_features, max_depth, workers)
+        self.logger.debug('export layer {layer_id} by {count} tiles'.format(layer_id=layer_id, count=len(tiles)))
+
+        stats = dict(tiles=len(tiles), features=0, duplicates=0)
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as tempdir:
+            done = [0]
+            lock = threading.Lock()
+
+            def export_tile(index):
+                tile_path = os.path.join(tempdir, '{index}.geojson'.format(index=index))
+                attempt = 0
+                while True:
+                    try:
+                        with open(tile_path, 'wb') as fp:
+                            self.export_vector_layer(fp, layer_id, intersects=self._bounds_wkt(tiles[index]), fid=fid)
+                        break
+                    except Exception as e:
+                        if attempt >= retries: raise
+                        delay = self.retry_policy.delay(attempt)
+                        self.logger.warning('export of tile {index} failed: {e}, retry in {delay:.1f} s'.format(index=index, e=e, delay=delay))
+                        time.sleep(delay)
+                        attempt += 1
+                if progress is not None:
+                    with lock:
+                        done[0] += 1
+                        progress(done[0], len(tiles))
+
+            result = self._run_bulk(range(len(tiles)), export_tile, workers, BulkResult())
+            self._raise_failed(result)
+
+            geojson_path = path if format == 'GeoJSON' else os.path.join(tempdir, 'merged.geojson')
+            # feature inside tile can not be in other tiles, so only fids of features on tile borders are kept
+            seen = set()
+            with open(geojson_path, 'wb') as out:
+                out.write(b'{"type": "FeatureCollection", "name": "' + str(layer_id).encode('ascii') + b'", "features": [\n')
+                separator = b''
+                for index, bounds in enumerate(tiles):
+                    with open(os.path.join(tempdir, '{index}.geojson'.format(index=index)), 'rb') as fp:
+                        for feature in iter_geojson_features(iter(lambda: fp.read(1024*1024), b'')):
+                            if not self._inside_bounds(feature.get('geometry'), bounds):
+                                feature_id = feature['properties'][fid]
+                                if feature_id in seen:
+                                    stats['duplicates'] += 1
+                                    continue
+                                seen.add(feature_id)
+                            out.write(separator + self.codec.dumps(feature))
+                            separator = b',\n'
+                            stats['features'] += 1
+                out.write(b'\n]}\n')
+
+            if feature_count is not None and stats['features'] != feature_count:
+                raise ValueError('tiled export of layer {layer_id} has {written} features, layer has {count}'.format(
+                    layer_id=layer_id, written=stats['features'], count=feature_count))
+
+            if format == 'GPKG':
+                gdal.UseExceptions()
+                gdal.VectorTranslate(path, geojson_path, format='GPKG', dstSRS='EPSG:'+str(srs), layerName=str(layer_id))
+        return stats
+
+    def get_layer_extent(self,layer_id)->dict:
+        """ extent of layer in EPSG:4326: dict with minLon, minLat, maxLon, maxLat, values are None for empty layer """
+        response = self._request('GET', '{url}/api/resource/{resource_id}/extent'.format(url=self.ngw_url, resource_id=layer_id))
+        response.raise_for_status()
+        return self._decode(response)['extent']
+
+    def _split_extent(self,layer_id,bounds,tile_features,max_depth,workers)->list:
+        # quadtree by levels, tiles of one level are probed concurrently. Empty tiles are dropped
+        url = self.ngw_url+'/api/resource/'+str(layer_id)+'/feature/'
+
+        def probe(tile):
+            params = {'intersects': self._bounds_wkt(tile), 'srs': 4326, 'limit': tile_features + 1, 'geom': 'no', 'fields': ''}
+            response = self._request('GET', url, params=params)
+            response.raise_for_status()
+            return len(self._decode(response))
+
+        tiles = list()
+        level = [bounds]
+        depth = 0
+        with self._executor(workers) as executor:
+            while level:
+                counts = list(executor.map(probe, level))
+                next_level = list()
+                for tile, count in zip(level, counts):
+                    if count == 0: continue
+                    if count <= tile_features or depth >= max_depth:
+                        tiles.append(tile)
+                        continue
+                    min_x, min_y, max_x, max_y = tile
+                    mid_x, mid_y = (min_x + max_x) / 2, (min_y + max_y) / 2
+                    next_level += [(min_x, min_y, mid_x, mid_y), (mid_x, min_y, max_x, mid_y),
+                                   (min_x, mid_y, mid_x, max_y), (mid_x, mid_y, max_x, max_y)]
+                level = next_level
+                depth += 1
+        return tiles
+
+    @staticmethod
+    def _bounds_wkt(bounds)->str:
+        min_x, min_y, max_x, max_y = bounds
+        return 'POLYGON(({x0} {y0},{x0} {y1},{x1} {y1},{x1} {y0},{x0} {y0}))'.format(x0=repr(min_x), y0=repr(min_y), x1=repr(max_x), y1=repr(max_y))
+
+    @staticmethod
+    def _inside_bounds(geometry,bounds)->bool:
+        """ True if all coordinates of GeoJSON geometry are strictly inside bounds """
+        if geometry is None: return False
+        min_x, min_y, max_x, max_y = bounds
+        stack = [geometry.get('coordinates')] if 'coordinates' in geometry else [element.get('coordinates') for element in geometry.get('geometries', [])]
+        while stack:
+            coordinates = stack.pop()
+            if not coordinates: continue
+            if isinstance(coordinates[0], (int, float)):
+                if not (min_x < coordinates[0] < max_x and min_y < coordinates[1] < max_y): return False
+            else:
+                stack.extend(coordinates)
+        return True
+
+    def _export_response(self,layer_id,format,srs,zipped,intersects,fid):
+        """ streamed response of export query """
+        url, params = self._export_query(layer_id,format,srs,zipped,intersects,fid)
+        self.logger.debug('download vector layer '+url)
+        response = self._request('GET', url, params=params,stream=True)
+        response.raise_for_status()
+        return response
+
+    def _export_query(self,layer_id,format,srs,zipped,intersects,fid):
+        """ url and params of export query """
         assert format in ('GeoJSON','GPKG','CSV')
         assert zipped in (False,True)
         if zipped == False:
@@ -841,13 +2045,7 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
         curl 'https://trolleway.nextgis.com/api/resource/4962/export?intersects=POLYGON%28%2830+50%2C30+55%2C35+55%2C35+50%2C30+50%29%29&intersects_srs=4326&format=GPKG&srs=3857&encoding=UTF-8&fid=ngw_id&display_name=false&fields=fid%2Cname_int%2Cdesc_ru&zipped=false' \
 
         '''
-
-        self.logger.debug('download vector layer '+url)
-        response = requests.get(url, params=params,stream=True,auth=self.ngw_creds)
-        response.raise_for_status()
-        with open(path, 'wb') as out_file:
-            shutil.copyfileobj(response.raw, out_file)
-        del response
+        return url, params
 
     def download_qgis_style(self,path,resource_id):
         """Download qgis vector style
@@ -865,10 +2063,7 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
             resource_id = resource_id
             )
 
-        response = requests.get(url, stream=True,auth=self.ngw_creds)
-        response.raise_for_status()
-        open(path, 'wb').write(response.content)
-        del response
+        self._cached_get(url, path=path)
 
     def get_TMS_url(self,style_id):
         url = '{url}/api/component/render/tile?resource={style_id}'
@@ -876,21 +2071,116 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
         url = url + '&x={x}&y={y}&z={z}'
         return url
 
+    def seed_tiles(self,style_id,path,bbox,min_zoom,max_zoom,workers=8,batch_size=256,progress=None)->dict:
+        """[Download tiles of style rendered by ngw into MBTiles file, for offline use]
+
+        Tiles are fetched concurrently through shared http session and written to file by batches.
+        Seeding is resumable: tiles which are already in file are skipped, so interrupted seeding is continued by same call.
+        Identical tiles (empty tiles outside of data) are stored once.
+        All tiles are tried and stored, then first error is raised; repeated call fetches only failed tiles.
+
+        Arguments:
+            style_id {int} -- [id of style, or list of ids rendered together]
+            path {str} -- [MBTiles file, created if not exists]
+            bbox {tuple} -- [min_lon, min_lat, max_lon, max_lat in EPSG:4326]
+            min_zoom {int} -- [first zoom level]
+            max_zoom {int} -- [last zoom level, inclusive]
+
+        Keyword Arguments:
+            workers {int} -- [number of tiles fetched concurrently] (default: {8})
+            batch_size {int} -- [tiles written to file in one transaction] (default: {256})
+            progress {callable} -- [called after each batch as progress(done, total)] (default: {None})
+
+        Returns:
+            [dict] -- [number of tiles: total, skipped (already in file), downloaded, failed, and distinct images in file]
+        """
+        from .tiles import MBTilesStore, iter_tiles, count_tiles
+        assert 0 <= min_zoom <= max_zoom and workers > 0 and batch_size > 0
+        resource = ','.join(str(id) for id in style_id) if isinstance(style_id, (list, tuple)) else str(style_id)
+        url = self.ngw_url + '/api/component/render/tile'
+
+        def fetch(tile):
+            zoom, x, y = tile
+            request = self._request('GET', url, params={'resource': resource, 'x': x, 'y': y, 'z': zoom})
+            request.raise_for_status()
+            return tile, request.content
+
+        stats = dict(total=count_tiles(bbox, min_zoom, max_zoom), skipped=0, downloaded=0, failed=0)
+        errors = dict()
+        with MBTilesStore(path) as store:
+            metadata = store.get_metadata()
+            store.set_metadata({'name': metadata.get('name', 'ngw style ' + resource), 'format': 'png', 'type': 'baselayer',
+                'bounds': ','.join(str(value) for value in bbox),
+                'minzoom': min(min_zoom, int(metadata.get('minzoom', min_zoom))),
+                'maxzoom': max(max_zoom, int(metadata.get('maxzoom', max_zoom)))})
+
+            def missing():
+                # stored tiles are loaded for one zoom level at a time
+                existing_zoom, existing = None, set()
+                for zoom, x, y in iter_tiles(bbox, min_zoom, max_zoom):
+                    if zoom != existing_zoom: existing_zoom, existing = zoom, store.existing(zoom)
+                    if (x, y) in existing:
+                        stats['skipped'] += 1
+                    else:
+                        yield zoom, x, y
+
+            batch = list()
+            def collect(futures):
+                for future in futures:
+                    try:
+                        (zoom, x, y), data = future.result()
+                    except Exception as e:
+                        stats['failed'] += 1
+                        errors[future.tile] = e
+                        self.logger.error('tile {tile} failed: {e}'.format(tile=future.tile, e=e))
+                        continue
+                    batch.append((zoom, x, y, data))
+                    stats['downloaded'] += 1
+                if len(batch) >= batch_size: flush()
+
+            def flush():
+                store.put_tiles(batch)
+                batch.clear()
+                if progress is not None: progress(stats['skipped'] + stats['downloaded'] + stats['failed'], stats['total'])
+
+            # bounded number of tiles in flight, tile list of large area is not built in memory
+            with self._executor(workers) as executor:
+                pending = set()
+                for tile in missing():
+                    if len(pending) >= workers * 4:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    future = executor.submit(fetch, tile)
+                    future.tile = tile
+                    pending.add(future)
+                collect(as_completed(pending))
+            flush()
+            stats['images'] = store.stats()['images']
+
+        self.logger.debug('seeded {downloaded} tiles, skipped {skipped}, failed {failed}'.format(**stats))
+        if errors: raise errors[min(errors)]
+        return stats
+
     def generate_name(self):
         return str(datetime.datetime.now())
 
     def get_resource(self,resource_id):
         """  wraper for simple GET """
+        if self.cache is not None:
+            found, response = self.cache.get(('resource', str(resource_id)))
+            if found: return response
         url = '{url}/api/resource/{resource_id}'
         url = url.format(url=self.ngw_url,
             resource_id = resource_id)
-        request = requests.get(url, auth=self.ngw_creds)
-        request.raise_for_status()
-        response = request.json()
+        generation = self.cache.generation if self.cache is not None else None
+        response = self.codec.loads(self._cached_get(url))
+        if self.cache is not None: self.cache.set(('resource', str(resource_id)), response, generation)
         return response
 
-    def get_features(self,resource_id:int,params:str='')->list:
+    def get_features(self,resource_id:int,params:str='',records:bool=False)->list:
         """  get all features from vector layer as is 
+        records: return FeatureRecord objects instead of dicts, they take less memory. With msgspec installed features are
+            decoded into records directly, else records are made from decoded dicts, see JsonCodec.loads_records
         params: GET params
         ?limit=(int:limit)&offset=(int:offset)&intersects=(string:wkt_string)&fields=(string:field_name_1,string:field_name_2,...)&fld_{field_name_1}=(string:value)&fld_{field_name_2}=(string:value)&fld_{field_name_3}__ilike=(string:value)&fld_{field_name_4}__like=(string:value)&extensions=(string:extensions)
         """
@@ -901,11 +2191,78 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
         if params != '':
             url=url+'?'+params
         
-        request = requests.get(url, auth=self.ngw_creds)
+        request = self._request('GET', url)
         request.raise_for_status()
-        response = request.json()
-        return response
+        if records: return self.codec.loads_records(request.content, FeatureRecord)
+        return self._decode(request)
+
+    def iter_features(self,resource_id:int,page_size:int=1000,params:str='',prefetch:bool=False,records:bool=False):
+        """  generator of features from vector layer, layer is read by pages with limit and offset,
+        so only one page (two with prefetch) is held in memory.
+
+        Arguments:
+            resource_id {int} -- [id of vector layer]
 
+        Keyword Arguments:
+            page_size {int} -- [number of features in one query] (default: {1000})
+            params {str} -- [GET params same as in get_features, except limit and offset] (default: {''})
+            prefetch {bool} -- [query next page in background thread while caller process current page] (default: {False})
+            records {bool} -- [yield FeatureRecord objects instead of dicts, see get_features] (default: {False})
+        """
+        assert page_size > 0
+
+        def get_page(offset):
+            page_params = 'limit={limit}&offset={offset}'.format(limit=page_size, offset=offset)
+            if params != '': page_params = params + '&' + page_params
+            return self.get_features(resource_id, page_params, records=records)
+
+        executor = self._executor(1) if prefetch else None
+        try:
+            offset = 0
+            page = get_page(offset)
+            while True:
+                if len(page) < page_size:
+                    yield from page
+                    return
+                offset += page_size
+                if executor is not None: next_page = executor.submit(get_page, offset)
+                yield from page
+                page = next_page.result() if executor is not None else get_page(offset)
+        finally:
+            if executor is not None: executor.shutdown(wait=False)
+
+    def get_features_table(self,resource_id:int,fields=None,geometry='wkb',page_size:int=10000,prefetch:bool=True):
+        """[Read vector layer into columnar FeatureTable with numpy arrays, instead of dict per feature]
+
+        Layer is read by pages, values are written into typed arrays by datatype of layer fields, nulls are masked.
+        Geometry is kept as WKB in one buffer with offsets, or as x and y arrays for point layers. Require numpy.
+
+        Arguments:
+            resource_id {int} -- [id of vector layer]
+
+        Keyword Arguments:
+            fields {list} -- [keynames of fields to read, all fields if None] (default: {None})
+            geometry {str} -- ['wkb', 'xy' for point layers, or None to skip geometry] (default: {'wkb'})
+            page_size {int} -- [number of features in one query] (default: {10000})
+            prefetch {bool} -- [query next page while current page is converted] (default: {True})
+
+        Returns:
+            [FeatureTable] -- [ids, columns, geometry. FeatureTable.to_pandas() and to_arrow() convert it, if pandas or pyarrow are installed]
+        """
+        try:
+            # columnar module imports numpy
+            from .columnar import FeatureTable
+        except ImportError as e:
+            raise ModuleNotFoundError('This method require numpy') from e
+        layer_fields = [(field['keyname'], field['datatype']) for field in self.get_resource(resource_id)['feature_layer']['fields']]
+        if fields is not None:
+            unknown = set(fields) - set(keyname for keyname, datatype in layer_fields)
+            if unknown: raise ValueError('fields {unknown} are not in layer {layer_id}'.format(unknown=', '.join(sorted(unknown)), layer_id=resource_id))
+            layer_fields = [(keyname, datatype) for keyname, datatype in layer_fields if keyname in fields]
+        params = 'fields={fields}&dt_format=iso&extensions='.format(fields=','.join(keyname for keyname, datatype in layer_fields))
+        if geometry is None: params += '&geom=no'
+        features = self.iter_features(resource_id, page_size=page_size, params=params, prefetch=prefetch)
+        return FeatureTable.from_features(features, layer_fields, geometry=geometry, capacity=self.get_feature_count(resource_id) or 0)
 
     def get_resource_url(self,resource_id)->str:
         """  return url of resource, like https://sandbox.nextgis.com/resourse/1234 """
@@ -920,36 +2277,88 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
         return resource['resource']['display_name']
  
     
-    def get_childs_resources(self,resource_group_id):
+    def get_childs_resources(self,resource_group_id,records=False):
         """[wraper for GET query ?parent= , with use login-password from class]
 
         Arguments:
             resource_group_id {int} -- [description]
 
+        Keyword Arguments:
+            records {bool} -- [return ResourceRecord objects instead of dicts. With msgspec installed listing is decoded into records directly] (default: {False})
+
         Returns:
             [str] -- [json with result]
         """
-        #
+        if records and self.cache is None:
+            request = self._request('GET', '{url}/api/resource/?parent={resource_group_id}'.format(url=self.ngw_url, resource_group_id=resource_group_id))
+            request.raise_for_status()
+            return self.codec.loads_records(request.content, ResourceRecord)
+        if records: return ResourceRecord.from_list(self.get_childs_resources(resource_group_id))
+        if self.cache is not None:
+            found, response = self.cache.get(('childs', str(resource_group_id)))
+            if found: return response
         url = '{url}/api/resource/?parent={resource_group_id}'
         url = url.format(url=self.ngw_url,
             resource_group_id = resource_group_id)
-        request = requests.get(url, auth=self.ngw_creds)
+        generation = self.cache.generation if self.cache is not None else None
+        request = self._request('GET', url)
         request.raise_for_status()
-        response = request.json()
+        response = self._decode(request)
+        if self.cache is not None: self.cache.set(('childs', str(resource_group_id)), response, generation)
         return response
     
-    def get_childs_ids_recursive(self,resource_id)->list():
+    def get_childs_ids_recursive(self,resource_id,workers=8)->list():
         # get flat list of ids of element resource tree
         # useful for loop call of change_resource_payload
+        # children are listed before their parents, resource_id is last
+        levels = dict()
+        for record, depth in self._walk_tree(resource_id, workers=workers):
+            levels.setdefault(depth, []).append(record.id)
         ids = list()
-        childs = self.get_childs_resources(resource_id)
-        for child in childs:
-            new_resource_id = child['resource']['id']    
-            ids = ids + self.get_childs_ids_recursive(new_resource_id)
-            if new_resource_id not in ids: ids.append(new_resource_id)
-        if resource_id not in ids: ids.append(resource_id)
+        for depth in sorted(levels, reverse=True):
+            ids.extend(levels[depth])
+        ids.append(resource_id)
         return ids
 
+    def walk_tree(self,resource_id=0,max_depth=None,cls=None,workers=8):
+        """[Generator of all resources under resource_id, breadth-first.
+        Child listings of discovered resources are queried concurrently, records are yielded as soon as their listing is received,
+        so caller can process early results before walk is finished]
+
+        Keyword Arguments:
+            resource_id {int} -- [id of root of walk, root itself is not yielded] (default: {0})
+            max_depth {int} -- [1 for direct children only, None for unlimited] (default: {None})
+            cls {str, list} -- [yield only resources with this cls, walk still goes through all resources] (default: {None})
+            workers {int} -- [number of listings queried concurrently, should not exceed pool_maxsize] (default: {8})
+
+        Yields:
+            [TreeRecord] -- [namedtuple (id, cls, parent_id, display_name)]
+        """
+        if isinstance(cls, str): cls = (cls,)
+        for record, depth in self._walk_tree(resource_id, max_depth, workers):
+            if cls is None or record.cls in cls: yield record
+
+    def _walk_tree(self,resource_id,max_depth=None,workers=8):
+        # yields tuples (TreeRecord, depth)
+        assert workers > 0
+        seen = {int(resource_id)}
+        executor = self._executor(workers)
+        try:
+            pending = {executor.submit(self.get_childs_resources, resource_id): (int(resource_id), 1)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    parent_id, depth = pending.pop(future)
+                    for child in future.result():
+                        child_id = child['resource']['id']
+                        if child_id in seen: continue
+                        seen.add(child_id)
+                        if max_depth is None or depth < max_depth:
+                            pending[executor.submit(self.get_childs_resources, child_id)] = (child_id, depth + 1)
+                        yield TreeRecord(child_id, child['resource']['cls'], parent_id, child['resource']['display_name']), depth
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def upload_qmls_byname(self,resource_group_id,qml_path):
         response = self.get_childs_resources(resource_group_id)
 
@@ -983,7 +2392,6 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
     def webmap_reorder_layers_by_list(self, webmap_id, orderlist):
 
         webmap_data = self.get_resource(webmap_id)
-        #pp.pprint(payload_pre['webmap']['root_item']['children'])
         layers = webmap_data['webmap']['root_item']['children']
 
         layers_reordered = self._sort_layers_by_list(layers,orderlist) #reordering will be here
@@ -991,7 +2399,7 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
         payload = {'webmap':{'root_item':{'item_type':'root', 'children': layers_reordered  } }}
 
         url=self.ngw_url+'/api/resource/'+str(webmap_id)
-        response = requests.put(url, json = payload, auth=self.ngw_creds)
+        response = self._request('PUT', url, json = payload)
         response.raise_for_status()
 
         response.raise_for_status()
@@ -1001,14 +2409,7 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
     def webmap_set_extent_by_layer(self,webmap_id,layer_id):
         assert self.get_resource(webmap_id)['resource']['cls'] == 'webmap'
 
-        webmap_data = self.get_resource(webmap_id)
-        url = '{url}/api/resource/{resource_id}/extent'
-        url = url.format(url=self.ngw_url,
-            resource_id = layer_id)
-        request = requests.get(url, auth=self.ngw_creds)
-        request.raise_for_status()
-        response = request.json()
-        extent = response['extent']
+        extent = self.get_layer_extent(layer_id)
 
         payload={'webmap':{"extent_left":extent['minLon'],"extent_right":extent['maxLon'],"extent_bottom":extent['minLat'],"extent_top":extent['maxLat']}}
         self.update_resource_payload(webmap_id,payload)
@@ -1028,7 +2429,8 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
         assert layer is not None
 
         url = 'NGW:' + self.ngw_url + '/resource/' + str(layer_id)
-        if self.log_level in ('DEBUG','ERROR'): 
+        # gdal debug output is on unless other level is set
+        if self.log_level in (None,'DEBUG','ERROR'): 
             gdal.SetConfigOption('CPL_DEBUG', 'ON')
             gdal.SetConfigOption('CPL_LOG_ERRORS', 'ON')
         assert isinstance(page_size, int)
@@ -1051,24 +2453,89 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
 
         return True
         
-    def download_ngw4qgis(self,group_id,filepath,overwrite=False,use_latest_qml=True,intersects=''):
+    def download_ngw4qgis(self,group_id,filepath,overwrite=False,use_latest_qml=True,intersects='',workers=1,progress=None,incremental=False)->dict:
         #download layers and styles from ngw 
         #styles renamed to layers name for open in qgis
+        """
+        Keyword Arguments:
+            workers {int} -- [number of layer exports and style downloads running concurrently] (default: {1})
+            progress {callable} -- [called after each layer as progress(done, total, layer_id, error), error is None on success] (default: {None})
+            incremental {bool} -- [keep manifest in filepath, download only layers and styles changed since previous run,
+                remove files of deleted layers. Layers with feature versioning are skipped by version, layers without it
+                are exported again and file is replaced only if export differs] (default: {False})
+
+        Returns:
+            [dict] -- [layer_id: exception for layers which was not downloaded. Failed layer does not stop others]
+        """
         
         from pathlib import Path
         Path(filepath).mkdir(parents=True, exist_ok=True)
         
         assert os.path.isdir(filepath)
+        assert workers > 0
         
-        vector_layers = self.search_by_cls(group_id,'vector_layer')
-        for layer_id in vector_layers:
-            resource=self.get_resource(layer_id)
-            layer_base_filepath = os.path.join(filepath,resource['resource']['display_name'])
-            
-            layer_filepath = layer_base_filepath+'.gpkg'
-            if overwrite and os.path.isfile(layer_filepath): os.remove(layer_filepath)
-            self.download_vector_layer(layer_filepath, layer_id, 'GPKG', 4326,intersects=intersects)
-            
+        vector_layers = self.search_resource(cls='vector_layer',parent_id=group_id)
+
+        manifest_path = os.path.join(filepath, self.MANIFEST_FILENAME)
+        old_manifest = dict()
+        if incremental and os.path.isfile(manifest_path):
+            with open(manifest_path) as fp:
+                old_manifest = json.load(fp).get('layers', {})
+        manifest = dict()
+
+        def unchanged(entry, key, marker):
+            # marker is same as in previous run, and local file is not changed since that
+            if marker is None or entry.get(key+'_marker') != marker: return False
+            return local_unchanged(entry, key)
+
+        def local_unchanged(entry, key):
+            if key not in entry: return False
+            local_path = os.path.join(filepath, entry[key])
+            if not os.path.isfile(local_path): return False
+            stat = os.stat(local_path)
+            return stat.st_size == entry[key+'_size'] and stat.st_mtime_ns == entry[key+'_mtime_ns']
+
+        def record(entry, key, filename, marker, sha256):
+            stat = os.stat(os.path.join(filepath, filename))
+            entry[key] = filename
+            entry[key+'_marker'] = marker
+            entry[key+'_sha256'] = sha256
+            entry[key+'_size'] = stat.st_size
+            entry[key+'_mtime_ns'] = stat.st_mtime_ns
+
+        def download_layer(resource):
+            layer_id = resource['resource']['id']
+            layer_filepath = os.path.join(filepath,resource['resource']['display_name'])+'.gpkg'
+            if not incremental:
+                if overwrite and os.path.isfile(layer_filepath): os.remove(layer_filepath)
+                self.download_vector_layer(layer_filepath, layer_id, 'GPKG', 4326,intersects=intersects)
+                return
+            entry = manifest.setdefault(str(layer_id), dict(display_name=resource['resource']['display_name']))
+            old_entry = old_manifest.get(str(layer_id), {})
+            marker = self._layer_marker(layer_id, intersects)
+            if unchanged(old_entry, 'gpkg', marker) and old_entry['gpkg'] == os.path.basename(layer_filepath):
+                self.logger.debug('layer {layer_id} not changed, skip'.format(layer_id=layer_id))
+                entry.update((key, value) for key, value in old_entry.items() if key.startswith('gpkg'))
+                return
+            # layer without versioning has no change marker, it is exported again and compared with previous export by sha256
+            download_path = layer_filepath + '.download'
+            try:
+                self.download_vector_layer(download_path, layer_id, 'GPKG', 4326,intersects=intersects)
+            except Exception:
+                if os.path.isfile(download_path): os.remove(download_path)
+                raise
+            sha256 = self._file_sha256(download_path)
+            if (old_entry.get('gpkg') == os.path.basename(layer_filepath) and old_entry.get('gpkg_sha256') == sha256
+                    and local_unchanged(old_entry, 'gpkg')):
+                os.remove(download_path)
+                entry.update((key, value) for key, value in old_entry.items() if key.startswith('gpkg'))
+                entry['gpkg_marker'] = marker
+                return
+            os.replace(download_path, layer_filepath)
+            record(entry, 'gpkg', os.path.basename(layer_filepath), marker, sha256)
+
+        def download_style(resource):
+            layer_id = resource['resource']['id']
             styles = self.get_childs_resources(layer_id)
             newlist = sorted(styles, key=lambda d: d['resource']['creation_date'] or 0,reverse=use_latest_qml) 
             styles=newlist
@@ -1076,17 +2543,86 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
             for style in styles:
 
                 if style['resource']['cls']!='qgis_vector_style': continue
-                qml_filename=layer_base_filepath+'.qml'
-                if overwrite and os.path.isfile(qml_filename): os.remove(qml_filename)
-
-                self.download_qgis_style(qml_filename, style['resource']['id'])
+                qml_filename=os.path.join(filepath,resource['resource']['display_name'])+'.qml'
+                if not incremental:
+                    if overwrite and os.path.isfile(qml_filename): os.remove(qml_filename)
+                    self.download_qgis_style(qml_filename, style['resource']['id'])
+                    break #download only one qml if many exists
+
+                # qml is small, so it is always queried, but written only when content is changed
+                entry = manifest.setdefault(str(layer_id), dict(display_name=resource['resource']['display_name']))
+                old_entry = old_manifest.get(str(layer_id), {})
+                response = self._request('GET', self.ngw_url+'/api/resource/'+str(style['resource']['id'])+'/qml')
+                response.raise_for_status()
+                sha256 = hashlib.sha256(response.content).hexdigest()
+                marker = str(style['resource']['id'])+':'+sha256
+                if unchanged(old_entry, 'qml', marker) and old_entry['qml'] == os.path.basename(qml_filename):
+                    entry.update((key, value) for key, value in old_entry.items() if key.startswith('qml'))
+                    break
+                with open(qml_filename, 'wb') as out_file:
+                    out_file.write(response.content)
+                record(entry, 'qml', os.path.basename(qml_filename), marker, sha256)
                 break #download only one qml if many exists
+
+        # export and style of same layer are separate tasks, so slow export does not hold style downloads
+        errors = dict()
+        parts_left = dict()
+        done = 0
+        with self._executor(workers) as executor:
+            futures = dict()
+            for resource in vector_layers:
+                layer_id = resource['resource']['id']
+                parts_left[layer_id] = 2
+                futures[executor.submit(download_layer, resource)] = layer_id
+                futures[executor.submit(download_style, resource)] = layer_id
+            for future in as_completed(futures):
+                layer_id = futures[future]
+                parts_left[layer_id] -= 1
+                if future.exception() is not None:
+                    self.logger.error('layer {layer_id} not downloaded: {e}'.format(layer_id=layer_id, e=future.exception()))
+                    errors.setdefault(layer_id, future.exception())
+                if parts_left[layer_id] == 0:
+                    done += 1
+                    if progress is not None: progress(done, len(vector_layers), layer_id, errors.get(layer_id))
+
+        if incremental:
+            # failed layers keep their files, but without markers, so they will be downloaded again on next run
+            for layer_id in errors:
+                entry = dict(old_manifest.get(str(layer_id), {}), **manifest.get(str(layer_id), {}))
+                manifest[str(layer_id)] = dict((key, value) for key, value in entry.items() if not key.endswith('_marker'))
+            # remove files of deleted layers, and files with old names of renamed layers
+            kept_files = set(value for entry in manifest.values() for key, value in entry.items() if key in ('gpkg', 'qml'))
+            for layer_id, entry in old_manifest.items():
+                for key in ('gpkg', 'qml'):
+                    if key in entry and entry[key] not in kept_files and os.path.isfile(os.path.join(filepath, entry[key])):
+                        self.logger.info('remove {filename} of layer {layer_id}'.format(filename=entry[key], layer_id=layer_id))
+                        os.remove(os.path.join(filepath, entry[key]))
+            with open(manifest_path+'.tmp', 'w') as fp:
+                json.dump(dict(group_id=group_id, intersects=intersects, layers=manifest), fp, indent=1)
+            os.replace(manifest_path+'.tmp', manifest_path)
+        return errors
         '''
         URL with geography filter
         curl 'https://trolleway.nextgis.com/api/resource/4962/export?intersects=POLYGON%28%2830+50%2C30+55%2C35+55%2C35+50%2C30+50%29%29&intersects_srs=4326&format=GPKG&srs=3857&encoding=UTF-8&fid=ngw_id&display_name=false&fields=fid%2Cname_int%2Cdesc_ru&zipped=false' \
 
         '''
 
+    def _layer_marker(self,layer_id,intersects=''):
+        # hash of layer metadata with feature version, when versioning is enabled on layer.
+        # None for layer without versioning: edit of features which keeps their count does not change metadata
+        resource = self.get_resource(layer_id)
+        versioning = (resource.get('feature_layer') or {}).get('versioning') or {}
+        if not versioning.get('enabled') or versioning.get('latest') is None: return None
+        state = dict(resource=resource, intersects=intersects)
+        return hashlib.sha256(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _file_sha256(self,path):
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as fp:
+            for block in iter(lambda: fp.read(1024*1024), b''):
+                sha256.update(block)
+        return sha256.hexdigest()
+
     def check_resource_id(self,resource_id)->bool:
         '''
         return True if api return ok for given resource id
@@ -1097,7 +2633,7 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
         
         try:
             url=self.ngw_url+'/api/resource/'+str(resource_id)
-            request = requests.get(url, auth=self.ngw_creds)
+            request = self._request('GET', url)
             request.raise_for_status()
             if request.status_code == 200:
                 return True
@@ -1112,10 +2648,10 @@ curl -d '{ "resource":{"cls":"vector_layer", "parent":{"id":0}, "display_name":"
         '''
         try:
             url = self.ngw_url + "/api/component/pyramid/pkg_version"
-            request = requests.get(url, auth=self.ngw_creds)
+            request = self._request('GET', url)
             request.raise_for_status()
             if request.status_code == 200:
-                request_json = request.json()
+                request_json = self._decode(request)
                 if "nextgisweb" not in request_json.keys():
                     return False
                 return True
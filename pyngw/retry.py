@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import datetime
+import random
+import threading
+import time
+
+
+class RetryPolicy:
+
+    '''
+    Decide which failed queries are repeated, and how long to wait before repeat.
+
+    Idempotent queries are repeated on 429, 502, 503, 504 responses, timeouts and connection errors.
+    Other queries (POST, PATCH) are repeated only on 429, because server did not process them.
+    Wait time is exponential backoff with full jitter, or Retry-After header of response if it is sent.
+    '''
+
+    RETRY_STATUSES = (429, 502, 503, 504)
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+    def __init__(self, max_retries=5, backoff=0.5, max_backoff=60):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def should_retry(self, method, attempt, status=None)->bool:
+        """ status is None for timeouts and connection errors """
+        if attempt >= self.max_retries: return False
+        if status == 429: return True
+        if method.upper() not in self.IDEMPOTENT_METHODS: return False
+        return status is None or status in self.RETRY_STATUSES
+
+    def delay(self, attempt, retry_after=None)->float:
+        """ seconds to wait before attempt+1 """
+        if retry_after is not None:
+            seconds = self._parse_retry_after(retry_after)
+            if seconds is not None: return min(self.max_backoff, seconds)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _parse_retry_after(self, value):
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        import email.utils
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class AdaptiveLimiter:
+
+    '''
+    Limit of queries in flight, adjusted by AIMD (additive increase, multiplicative decrease) like TCP congestion window.
+
+    Each successful query increases limit by 1/limit, so limit grows by one after limit successful queries.
+    Failed query (429, 5xx, timeout) or query slower than latency_target multiplies limit by decrease factor,
+    not more often than once per latency of query, so burst of errors from one overload cuts limit once.
+    '''
+
+    def __init__(self, initial=10, minimum=1, maximum=10, latency_target=None, decrease=0.5):
+        assert 1 <= minimum <= maximum
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.latency_target = latency_target
+        self.decrease = decrease
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, ok=True, latency=0.0):
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if not ok or (self.latency_target is not None and latency > self.latency_target):
+                if now - self._last_decrease > latency:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
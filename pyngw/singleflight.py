@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+
+
+class _Call:
+    # query in flight, waiting callers get its result or exception
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    '''
+    Coalescing of identical concurrent calls: while call with key runs, callers with same key wait for it
+    and share its result or exception instead of making own call.
+
+    invalidate() is called after writes: calls started later do not join calls started before,
+    so caller reads its own changes.
+    '''
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._generation = 0
+        self._flights = dict()
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """ return result of function(), shared with concurrent calls of same key """
+        with self._lock:
+            key = (self._generation, key)
+            call = self._flights.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = self._flights[key] = _Call()
+                self.calls += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None: raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            call.done.set()
+        return call.result
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+
+    def stats(self)->dict:
+        """ return calls made and shared (calls saved by coalescing) """
+        with self._lock:
+            return dict(calls=self.calls, shared=self.shared)
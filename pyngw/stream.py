@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import codecs
+import json
+import re
+import struct
+import zlib
+
+_LOCAL_HEADER = b'PK\x03\x04'
+_CENTRAL_HEADER = b'PK\x01\x02'
+_END_OF_CENTRAL = b'PK\x05\x06'
+_ZIP64_END_OF_CENTRAL = b'PK\x06\x06'
+_DATA_DESCRIPTOR = b'PK\x07\x08'
+_NEXT_SIGNATURES = (_LOCAL_HEADER, _CENTRAL_HEADER, _END_OF_CENTRAL, _ZIP64_END_OF_CENTRAL)
+
+_FEATURES_KEY = re.compile(r'"features"\s*:\s*\[')
+
+
+class _Buffer:
+    # bytes from iterator of chunks, read by exact sizes
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.data = b''
+        self.eof = False
+
+    def fill(self, size)->bool:
+        """ read chunks until size bytes are buffered, return False if stream is shorter """
+        while len(self.data) < size and not self.eof:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.eof = True
+            else:
+                self.data += chunk
+        return len(self.data) >= size
+
+    def take(self, size)->bytes:
+        if not self.fill(size): raise ValueError('zip stream is truncated')
+        data, self.data = self.data[:size], self.data[size:]
+        return data
+
+    def take_available(self)->bytes:
+        if not self.data: self.fill(1)
+        data, self.data = self.data, b''
+        return data
+
+    def push_back(self, data):
+        self.data = data + self.data
+
+
+def iter_unzip(chunks):
+    """[Decompress zip archive from iterator of bytes chunks, without seek and temp file]
+
+    Archive is read by local file headers, as it is received. Members can be stored or deflated,
+    with sizes in header or in data descriptor after data (archives written to non-seekable stream), zip64 is supported.
+
+    Arguments:
+        chunks {iterable} -- [bytes chunks of zip archive]
+
+    Returns:
+        [generator] -- [tuples (member name, bytes chunk). Every member ends with chunk b'' ]
+    """
+    buffer = _Buffer(chunks)
+    while True:
+        if not buffer.fill(4) or buffer.data[:4] != _LOCAL_HEADER:
+            if buffer.data[:4] in _NEXT_SIGNATURES or not buffer.data: return
+            raise ValueError('zip stream is damaged: local file header expected')
+        (signature, version, flags, method, mtime, mdate, crc, compressed_size, size,
+         name_length, extra_length) = struct.unpack('<4sHHHHHIIIHH', buffer.take(30))
+        name = buffer.take(name_length).decode('utf-8' if flags & 0x800 else 'cp437')
+        extra = buffer.take(extra_length)
+        if compressed_size == 0xFFFFFFFF or size == 0xFFFFFFFF:
+            size, compressed_size = _zip64_sizes(extra, size, compressed_size)
+        if flags & 0x1: raise ValueError('zip member {name} is encrypted'.format(name=name))
+        has_descriptor = bool(flags & 0x8)
+
+        checksum = 0
+        if method == 8:
+            decompressor = zlib.decompressobj(-15)
+            while not decompressor.eof:
+                data = buffer.take_available()
+                if not data: raise ValueError('zip stream is truncated')
+                output = decompressor.decompress(data)
+                if decompressor.unused_data: buffer.push_back(decompressor.unused_data)
+                if output:
+                    checksum = zlib.crc32(output, checksum)
+                    yield name, output
+        elif method == 0:
+            if has_descriptor: raise ValueError('stored zip member {name} without size is not supported'.format(name=name))
+            remaining = compressed_size
+            while remaining > 0:
+                data = buffer.take_available()
+                if not data: raise ValueError('zip stream is truncated')
+                if len(data) > remaining:
+                    buffer.push_back(data[remaining:])
+                    data = data[:remaining]
+                remaining -= len(data)
+                checksum = zlib.crc32(data, checksum)
+                yield name, data
+        else:
+            raise ValueError('zip member {name} has unsupported compression method {method}'.format(name=name, method=method))
+
+        if has_descriptor: crc = _skip_data_descriptor(buffer)
+        if checksum != crc: raise ValueError('zip member {name} has wrong crc32'.format(name=name))
+        yield name, b''
+
+
+def _zip64_sizes(extra, size, compressed_size):
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, data_size = struct.unpack('<HH', extra[offset:offset+4])
+        if header_id == 0x0001:
+            data = extra[offset+4:offset+4+data_size]
+            position = 0
+            if size == 0xFFFFFFFF:
+                size = struct.unpack('<Q', data[position:position+8])[0]
+                position += 8
+            if compressed_size == 0xFFFFFFFF:
+                compressed_size = struct.unpack('<Q', data[position:position+8])[0]
+            break
+        offset += 4 + data_size
+    return size, compressed_size
+
+
+def _skip_data_descriptor(buffer)->int:
+    # descriptor is crc32 and sizes of 4 or 8 bytes, signature is optional. Length is found by signature of next record
+    buffer.fill(28)
+    start = 4 if buffer.data[:4] == _DATA_DESCRIPTOR else 0
+    for length in (start + 12, start + 20):
+        if buffer.data[length:length+4] in _NEXT_SIGNATURES or (buffer.eof and len(buffer.data) == length):
+            crc = struct.unpack('<I', buffer.data[start:start+4])[0]
+            buffer.take(length)
+            return crc
+    raise ValueError('zip stream is damaged: data descriptor not found')
+
+
+def iter_geojson_features(chunks, decoder=None):
+    """[Parse features of GeoJSON FeatureCollection from iterator of bytes chunks]
+
+    Memory usage is bounded by size of largest feature and chunk, not by size of collection.
+
+    Arguments:
+        chunks {iterable} -- [bytes chunks of utf-8 GeoJSON]
+
+    Keyword Arguments:
+        decoder {json.JSONDecoder} -- [decoder with raw_decode method] (default: {json.JSONDecoder()})
+
+    Returns:
+        [generator] -- [feature dicts]
+    """
+    decoder = decoder or json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    chunks = iter(chunks)
+    text = ''
+    eof = False
+
+    def read()->bool:
+        nonlocal text, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            text += text_decoder.decode(b'', final=True)
+            return False
+        text += text_decoder.decode(chunk)
+        return True
+
+    # skip collection members before features array
+    while True:
+        match = _FEATURES_KEY.search(text)
+        if match is not None:
+            text = text[match.end():]
+            break
+        # keep tail which can contain beginning of "features" key
+        text = text[-64:]
+        if not read(): raise ValueError('GeoJSON stream has no features array')
+
+    position = 0
+    wanted = 0
+    while True:
+        while position < len(text) and text[position] in ' \t\r\n,':
+            position += 1
+        if position < len(text) and text[position] == ']': return
+        # feature is parsed when enough text is buffered, repeat after every chunk would be quadratic for large features
+        if position >= len(text) or len(text) - position < wanted:
+            text = text[position:]
+            position = 0
+            if not read() and not text: raise ValueError('GeoJSON stream is truncated')
+            if not eof: continue
+        try:
+            feature, end = decoder.raw_decode(text, position)
+        except ValueError:
+            if eof: raise
+            wanted = 2 * (len(text) - position)
+            continue
+        wanted = 0
+        position = end
+        yield feature
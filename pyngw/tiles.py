@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import math
+import sqlite3
+
+MAX_LATITUDE = 85.0511287798
+
+
+def lonlat_to_tile(lon, lat, zoom)->tuple:
+    """ XYZ tile (x, y) which contains point, y is counted from north """
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    count = 1 << zoom
+    x = int((lon + 180.0) / 360.0 * count)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * count)
+    return min(max(x, 0), count - 1), min(max(y, 0), count - 1)
+
+
+def tile_range(bbox, zoom)->tuple:
+    """ inclusive ranges of x and y of tiles covering bbox (min_lon, min_lat, max_lon, max_lat) """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    min_x, min_y = lonlat_to_tile(min_lon, max_lat, zoom)
+    max_x, max_y = lonlat_to_tile(max_lon, min_lat, zoom)
+    return (min_x, max_x), (min_y, max_y)
+
+
+def count_tiles(bbox, min_zoom, max_zoom)->int:
+    total = 0
+    for zoom in range(min_zoom, max_zoom + 1):
+        (min_x, max_x), (min_y, max_y) = tile_range(bbox, zoom)
+        total += (max_x - min_x + 1) * (max_y - min_y + 1)
+    return total
+
+
+def iter_tiles(bbox, min_zoom, max_zoom):
+    """[XYZ tiles covering bbox in EPSG:4326 on zoom levels from min_zoom to max_zoom]
+
+    Returns:
+        [generator] -- [tuples (z, x, y)]
+    """
+    for zoom in range(min_zoom, max_zoom + 1):
+        (min_x, max_x), (min_y, max_y) = tile_range(bbox, zoom)
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                yield zoom, x, y
+
+
+class MBTilesStore:
+
+    '''
+    Tiles in MBTiles file (SQLite). Identical tiles, like empty tiles outside of data, are stored once:
+    map table links tile coordinates to image in images table by sha1 of image, tiles view is read by MBTiles clients.
+
+    Methods take XYZ coordinates, rows are flipped to TMS scheme of MBTiles inside.
+    Store is used from one thread.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS images (tile_id TEXT PRIMARY KEY, tile_data BLOB);
+            CREATE TABLE IF NOT EXISTS map (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT,
+                PRIMARY KEY (zoom_level, tile_column, tile_row));
+            CREATE VIEW IF NOT EXISTS tiles AS SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column,
+                map.tile_row AS tile_row, images.tile_data AS tile_data FROM map JOIN images ON images.tile_id = map.tile_id;
+        ''')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def set_metadata(self, metadata:dict):
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)',
+                [(name, str(value)) for name, value in metadata.items()])
+
+    def get_metadata(self)->dict:
+        return dict(self.connection.execute('SELECT name, value FROM metadata'))
+
+    def existing(self, zoom)->set:
+        """ set of (x, y) of stored tiles on zoom level """
+        top = (1 << zoom) - 1
+        return set((x, top - row) for x, row in self.connection.execute(
+            'SELECT tile_column, tile_row FROM map WHERE zoom_level = ?', (zoom,)))
+
+    def put_tiles(self, tiles):
+        """ store list of (z, x, y, data) in one transaction """
+        images = dict()
+        rows = list()
+        for zoom, x, y, data in tiles:
+            tile_id = hashlib.sha1(data).hexdigest()
+            images[tile_id] = data
+            rows.append((zoom, x, (1 << zoom) - 1 - y, tile_id))
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO images (tile_id, tile_data) VALUES (?, ?)', images.items())
+            self.connection.executemany('INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id) VALUES (?, ?, ?, ?)', rows)
+
+    def get_tile(self, zoom, x, y):
+        """ image of tile or None """
+        row = self.connection.execute('SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?',
+            (zoom, x, (1 << zoom) - 1 - y)).fetchone()
+        return row[0] if row is not None else None
+
+    def stats(self)->dict:
+        """ number of tiles and number of distinct images """
+        tiles = self.connection.execute('SELECT count(*) FROM map').fetchone()[0]
+        images = self.connection.execute('SELECT count(*) FROM images').fetchone()[0]
+        return dict(tiles=tiles, images=images)
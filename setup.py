@@ -14,12 +14,17 @@ setuptools.setup(
     url="https://github.com/nextgis/pyngw",
     packages=setuptools.find_packages(),
     install_requires=[
-          'tuspy',
+          'requests',
       ],
+    extras_require={
+          'columnar': ['numpy'],
+          'fast': ['orjson', 'msgspec'],
+          'async': ['aiohttp'],
+      },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.0',
+    python_requires='>=3.9',
 )